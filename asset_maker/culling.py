@@ -0,0 +1,169 @@
+import ctypes
+import numpy as np
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_0 import glGetFloatv as raw_glGetFloatv
+from OpenGL.raw.GL.VERSION.GL_1_0 import glGetIntegerv as raw_glGetIntegerv
+
+# -------------------------------------------------
+# Off-screen culling
+# -------------------------------------------------
+# Shapes carry bounding boxes from load time (geometry.shape_bounds). A ClipSpace
+# captures the current modelview, projection and viewport once; each box is then
+# moved by its draw offset and scale, taken through them, and skipped if it ends
+# up outside the viewport. InstanceBatch captures one per flush; draw_at only
+# culls when a caller passes one in, since for a single shape the capture costs
+# more than the draw it might save. Meshes also test each of their batches, so a
+# big background that is only partly on screen submits only the visible parts.
+#
+# Boxes are grown by CULL_MARGIN_PX on screen, which covers the 2px outlines and
+# the padding around baked shadows.
+CULL_MARGIN_PX = 2.0
+
+_settings = {"enabled": True}
+_stats = {"shapes_drawn": 0, "shapes_culled": 0, "batches_drawn": 0, "batches_culled": 0}
+
+
+def culling_enabled():
+    return _settings["enabled"]
+
+
+def set_culling(enabled):
+    _settings["enabled"] = bool(enabled)
+
+
+def cull_stats():
+    """Shapes and mesh batches drawn and culled since the last reset_cull_stats()."""
+    return dict(_stats)
+
+
+def reset_cull_stats():
+    for key in _stats:
+        _stats[key] = 0
+
+
+def count_shapes(drawn, culled=0):
+    _stats["shapes_drawn"] += drawn
+    _stats["shapes_culled"] += culled
+
+
+def count_batches(drawn, culled=0):
+    _stats["batches_drawn"] += drawn
+    _stats["batches_culled"] += culled
+
+
+# raw entry points: the wrapped glGetFloatv costs ~13us a call, these ~1us
+_matrix_buffer = (ctypes.c_float * 16)()
+_viewport_buffer = (ctypes.c_int * 4)()
+
+# visibility of a placed box
+CULLED, PARTIAL, INSIDE = 0, 1, 2
+
+
+class ClipSpace:
+    """
+    The current modelview, projection and viewport, captured once so that many
+    boxes can be tested against them. Only the parts a 2D point needs are kept.
+    """
+
+    def __init__(self):
+        # GL hands the matrices back column-major, i.e. transposed, so a row vector
+        # times modelview times projection lands in clip space.
+        raw_glGetFloatv(GL_MODELVIEW_MATRIX, _matrix_buffer)
+        m = _matrix_buffer[:]
+        raw_glGetFloatv(GL_PROJECTION_MATRIX, _matrix_buffer)
+        p = _matrix_buffer[:]
+        # rows x, y and translation of modelview @ projection, columns x, y and w
+        self.rows = [(m[i] * p[0] + m[i + 1] * p[4] + m[i + 2] * p[8] + m[i + 3] * p[12],
+                      m[i] * p[1] + m[i + 1] * p[5] + m[i + 2] * p[9] + m[i + 3] * p[13],
+                      m[i] * p[3] + m[i + 1] * p[7] + m[i + 2] * p[11] + m[i + 3] * p[15])
+                     for i in (0, 4, 12)]
+        raw_glGetIntegerv(GL_VIEWPORT, _viewport_buffer)
+        width, height = max(1, _viewport_buffer[2]), max(1, _viewport_buffer[3])
+        self.margin = (2.0 * CULL_MARGIN_PX / width, 2.0 * CULL_MARGIN_PX / height)
+
+    def test(self, box):
+        """CULLED, PARTIAL or INSIDE for one (min_x, min_y, max_x, max_y) box in modelview units."""
+        (ax, ay, aw), (bx, by, bw), (tx, ty, tw) = self.rows
+        xs, ys = [], []
+        for x, y in ((box[0], box[1]), (box[2], box[1]), (box[2], box[3]), (box[0], box[3])):
+            w = x * aw + y * bw + tw
+            if abs(w) < 1e-12:
+                w = 1e-12
+            xs.append((x * ax + y * bx + tx) / w)
+            ys.append((x * ay + y * by + ty) / w)
+        mx, my = self.margin
+        low_x, high_x, low_y, high_y = min(xs), max(xs), min(ys), max(ys)
+        if high_x < -1.0 - mx or low_x > 1.0 + mx or high_y < -1.0 - my or low_y > 1.0 + my:
+            return CULLED
+        if low_x >= -1.0 and high_x <= 1.0 and low_y >= -1.0 and high_y <= 1.0:
+            return INSIDE
+        return PARTIAL
+
+    def visible(self, boxes):
+        """
+        For an (n, 4) array of boxes in modelview units, a boolean array telling
+        which of them overlap the viewport.
+        """
+        boxes = np.asarray(boxes, dtype=np.float64).reshape(-1, 4)
+        matrix = np.array(self.rows, dtype=np.float64)
+        corners = np.stack([boxes[:, [0, 1]], boxes[:, [2, 1]],
+                            boxes[:, [2, 3]], boxes[:, [0, 3]]], axis=1)
+        clip = corners @ matrix[0:2] + matrix[2]
+        w = clip[:, :, 2:3]
+        w = np.where(np.abs(w) < 1e-12, 1e-12, w)
+        ndc = clip[:, :, 0:2] / w
+        low, high = ndc.min(axis=1), ndc.max(axis=1)
+        mx, my = self.margin
+        return ((high[:, 0] >= -1.0 - mx) & (low[:, 0] <= 1.0 + mx) &
+                (high[:, 1] >= -1.0 - my) & (low[:, 1] <= 1.0 + my))
+
+
+def place_box(bounds, x, y, scalex, scaley):
+    """A local box moved by a draw_at-style offset and scale; negative scales mirror it."""
+    x0, x1 = x + bounds[0] * scalex, x + bounds[2] * scalex
+    y0, y1 = y + bounds[1] * scaley, y + bounds[3] * scaley
+    return (min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+
+
+def place_boxes(bounds, transforms):
+    """
+    place_box() with numpy: one box with n (x, y, scalex, scaley) transforms, or n
+    boxes with one transform, gives the (n, 4) placed boxes.
+    """
+    transforms = np.asarray(transforms, dtype=np.float64).reshape(-1, 4)
+    bounds = np.asarray(bounds, dtype=np.float64).reshape(-1, 4)
+    x, y, sx, sy = transforms.T
+    x0, x1 = x + bounds[:, 0] * sx, x + bounds[:, 2] * sx
+    y0, y1 = y + bounds[:, 1] * sy, y + bounds[:, 3] * sy
+    return np.stack([np.minimum(x0, x1), np.minimum(y0, y1),
+                     np.maximum(x0, x1), np.maximum(y0, y1)], axis=1)
+
+
+def shape_visible(bounds, x, y, scalex, scaley, clip=None):
+    """
+    Whether a shape with local bounds drawn at (x, y, scalex, scaley) reaches the
+    viewport of clip: CULLED, PARTIAL or INSIDE, counted in the cull stats. Shapes
+    without bounds or without a clip, and all shapes while culling is off, count
+    as PARTIAL.
+    """
+    if bounds is None or clip is None or not culling_enabled():
+        count_shapes(1)
+        return PARTIAL
+    result = clip.test(place_box(bounds, x, y, scalex, scaley))
+    count_shapes(int(result != CULLED), int(result == CULLED))
+    return result
+
+
+def visible_instances(bounds, transforms, clip):
+    """
+    shape_visible() for many (x, y, scalex, scaley) placements of one shape at once:
+    a boolean mask over the rows of transforms, or None if nothing can be culled.
+    """
+    n = len(transforms)
+    if bounds is None or not culling_enabled():
+        count_shapes(n)
+        return None
+    mask = clip.visible(place_boxes(bounds, transforms))
+    drawn = int(mask.sum())
+    count_shapes(drawn, n - drawn)
+    return mask
@@ -0,0 +1,323 @@
+import numpy as np
+
+# -------------------------------------------------
+# Geometry helpers for loaded shapes (no GL calls in here)
+# -------------------------------------------------
+EPSILON = 1e-9
+
+
+def stroke_cache(stroke):
+    """
+    Returns the dict a stroke keeps its derived data in (triangles, ...).
+    It lives under the "_cache" key, which save_shapes never writes out.
+    """
+    cache = stroke.get("_cache")
+    if cache is None:
+        cache = stroke["_cache"] = {}
+    return cache
+
+
+def _same(p, q):
+    return p[0] == q[0] and p[1] == q[1]
+
+
+def _cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def signed_area(pts):
+    """Shoelace area; the sign gives the winding of the polygon."""
+    area = 0.0
+    n = len(pts)
+    for i in range(n):
+        x1, y1 = pts[i]
+        x2, y2 = pts[(i + 1) % n]
+        area += x1 * y2 - x2 * y1
+    return area / 2.0
+
+
+def _point_in_triangle(p, a, b, c):
+    d1 = _cross(a, b, p)
+    d2 = _cross(b, c, p)
+    d3 = _cross(c, a, p)
+    has_neg = d1 < -EPSILON or d2 < -EPSILON or d3 < -EPSILON
+    has_pos = d1 > EPSILON or d2 > EPSILON or d3 > EPSILON
+    return not (has_neg and has_pos)
+
+
+def _clean_ring(pts):
+    """Indices of the polygon with repeated and collinear points dropped."""
+    ring = []
+    for i in range(len(pts)):
+        if ring and _same(pts[i], pts[ring[-1]]):
+            continue
+        ring.append(i)
+    if len(ring) > 1 and _same(pts[ring[0]], pts[ring[-1]]):
+        ring.pop()
+
+    changed = True
+    while changed and len(ring) > 3:
+        changed = False
+        for k in range(len(ring)):
+            prev_i, cur_i, next_i = ring[k - 1], ring[k], ring[(k + 1) % len(ring)]
+            if abs(_cross(pts[prev_i], pts[cur_i], pts[next_i])) <= EPSILON:
+                ring.pop(k)
+                changed = True
+                break
+    return ring
+
+
+def _is_convex(pts, ring, sign):
+    n = len(ring)
+    for k in range(n):
+        turn = _cross(pts[ring[k - 1]], pts[ring[k]], pts[ring[(k + 1) % n]])
+        if turn * sign < 0:
+            return False
+    return True
+
+
+def triangulate(pts):
+    """
+    Triangulates a simple polygon by ear clipping and returns a flat list of indices
+    into pts, three per triangle. Convex polygons take a triangle-fan fast path.
+    Self-intersecting outlines (freehand doodles) are clipped as far as possible
+    and the remainder is fanned, which is what GL_POLYGON would have done anyway.
+    """
+    if len(pts) < 3:
+        return []
+    ring = _clean_ring(pts)
+    if len(ring) < 3:
+        return []
+    area = signed_area([pts[i] for i in ring])
+    if abs(area) <= EPSILON:
+        return []
+    sign = 1.0 if area > 0 else -1.0
+
+    if _is_convex(pts, ring, sign):
+        tris = []
+        for k in range(1, len(ring) - 1):
+            tris.extend((ring[0], ring[k], ring[k + 1]))
+        return tris
+
+    tris = []
+    while len(ring) > 3:
+        n = len(ring)
+        for k in range(n):
+            i_prev, i_cur, i_next = ring[k - 1], ring[k], ring[(k + 1) % n]
+            a, b, c = pts[i_prev], pts[i_cur], pts[i_next]
+            if _cross(a, b, c) * sign <= EPSILON:
+                continue  # reflex or flat corner, not an ear
+            ear = True
+            for j in ring:
+                if j in (i_prev, i_cur, i_next):
+                    continue
+                p = pts[j]
+                if _same(p, a) or _same(p, b) or _same(p, c):
+                    continue
+                if _point_in_triangle(p, a, b, c):
+                    ear = False
+                    break
+            if ear:
+                tris.extend((i_prev, i_cur, i_next))
+                ring.pop(k)
+                break
+        else:
+            break  # no ear left: the outline crosses itself
+    if len(ring) >= 3:
+        for k in range(1, len(ring) - 1):
+            tris.extend((ring[0], ring[k], ring[k + 1]))
+    return tris
+
+
+def fill_indices(stroke):
+    """
+    Triangle indices for a stroke's fill, computed once and cached on the stroke.
+    The cache is dropped if the stroke's points list is swapped or grows (editor).
+    """
+    pts = stroke.get("points", [])
+    cache = stroke_cache(stroke)
+    cached = cache.get("triangles")
+    if cached is not None and cached[0] is pts and cached[1] == len(pts):
+        return cached[2]
+    tris = triangulate(pts)
+    cache["triangles"] = (pts, len(pts), tris)
+    return tris
+
+
+
+def point_array(stroke, key="points"):
+    """
+    The stroke's points as a contiguous (n, 2) float32 array for glVertexPointer,
+    cached on the stroke and rebuilt if the points list is swapped or grows (editor).
+    """
+    pts = stroke.get(key, [])
+    cache = stroke_cache(stroke)
+    cached = cache.get("array_" + key)
+    if cached is not None and cached[0] is pts and cached[1] == len(pts):
+        return cached[2]
+    array = np.asarray(pts, dtype=np.float32).reshape(-1, 2)  # no copy for .shpb arrays
+    cache["array_" + key] = (pts, len(pts), array)
+    return array
+
+
+def fill_index_array(stroke):
+    """fill_indices() as a uint32 array for glDrawElements, cached alongside the triangles."""
+    tris = fill_indices(stroke)
+    cache = stroke_cache(stroke)
+    cached = cache.get("triangle_array")
+    if cached is not None and cached[0] is tris:
+        return cached[1]
+    array = np.array(tris, dtype=np.uint32)
+    cache["triangle_array"] = (tris, array)
+    return array
+
+# -------------------------------------------------
+# Bounding boxes
+# -------------------------------------------------
+def stroke_bounds(stroke):
+    """
+    (min_x, min_y, max_x, max_y) of a stroke's points in shape units, or None if it
+    has none. Cached on the stroke like the triangles.
+    """
+    key = "points" if "points" in stroke else "fixed_points"
+    pts = stroke.get(key, [])
+    cache = stroke_cache(stroke)
+    cached = cache.get("bounds")
+    if cached is not None and cached[0] is pts and cached[1] == len(pts):
+        return cached[2]
+    bounds = None
+    if len(pts):
+        array = point_array(stroke, key)
+        low, high = array.min(axis=0), array.max(axis=0)
+        bounds = (float(low[0]), float(low[1]), float(high[0]), float(high[1]))
+    cache["bounds"] = (pts, len(pts), bounds)
+    return bounds
+
+
+def union_bounds(boxes):
+    """The box around a list of boxes (None entries are skipped), or None."""
+    boxes = [b for b in boxes if b is not None]
+    if not boxes:
+        return None
+    return (min(b[0] for b in boxes), min(b[1] for b in boxes),
+            max(b[2] for b in boxes), max(b[3] for b in boxes))
+
+
+def shape_bounds(shape):
+    """
+    Box around a whole shape. Loaded shapes carry it precomputed in .bounds; plain
+    lists of strokes are measured on every call.
+    """
+    bounds = getattr(shape, "bounds", None)
+    if bounds is not None:
+        return bounds
+    return union_bounds(stroke_bounds(stroke) for stroke in shape)
+
+
+# -------------------------------------------------
+# Level of detail (Ramer-Douglas-Peucker)
+# -------------------------------------------------
+# Largest on-screen deviation, in pixels, a simplified outline may have from the original.
+LOD_ERROR_PX = 0.5
+# Tier k is meant for scales up to 2 ** -k; tier 0 is the full-detail shape.
+MAX_LOD_TIER = 4
+
+
+def _segment_distance(p, a, b):
+    """Distance from p to the segment a-b."""
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    length_sq = dx * dx + dy * dy
+    if length_sq <= EPSILON:
+        return ((p[0] - a[0]) ** 2 + (p[1] - a[1]) ** 2) ** 0.5
+    t = ((p[0] - a[0]) * dx + (p[1] - a[1]) * dy) / length_sq
+    t = max(0.0, min(1.0, t))
+    cx, cy = a[0] + t * dx, a[1] + t * dy
+    return ((p[0] - cx) ** 2 + (p[1] - cy) ** 2) ** 0.5
+
+
+def _rdp_keep(pts, first, last, tolerance, keep):
+    """Marks the points of pts[first..last] that RDP keeps (iterative, no recursion limit)."""
+    stack = [(first, last)]
+    while stack:
+        first, last = stack.pop()
+        worst, worst_i = -1.0, None
+        for i in range(first + 1, last):
+            d = _segment_distance(pts[i], pts[first], pts[last])
+            if d > worst:
+                worst, worst_i = d, i
+        if worst_i is not None and worst > tolerance:
+            keep[worst_i] = True
+            stack.append((first, worst_i))
+            stack.append((worst_i, last))
+
+
+def simplify(pts, tolerance, closed=False):
+    """
+    Ramer-Douglas-Peucker simplification of a polyline (or ring, if closed).
+    Returns pts itself when no point can be dropped, so callers can tell nothing changed.
+    """
+    n = len(pts)
+    if tolerance <= 0 or n < (4 if closed else 3):
+        return pts
+    keep = [False] * n
+    keep[0] = True
+    if closed:
+        # Split the ring at the point farthest from the start, simplify both halves.
+        far = max(range(1, n), key=lambda i: (pts[i][0] - pts[0][0]) ** 2 + (pts[i][1] - pts[0][1]) ** 2)
+        keep[far] = True
+        _rdp_keep(pts, 0, far, tolerance, keep)
+        ring = list(pts) + [pts[0]]
+        keep.append(True)
+        _rdp_keep(ring, far, n, tolerance, keep)
+        keep.pop()
+    else:
+        keep[-1] = True
+        _rdp_keep(pts, 0, n - 1, tolerance, keep)
+
+    kept = [pts[i] for i in range(n) if keep[i]]
+    if len(kept) == n:
+        return pts
+    if closed and len(kept) < 3:
+        # Keep a triangle so tiny closed shapes still cover a few pixels.
+        kept = [pts[0], pts[n // 3], pts[(2 * n) // 3]]
+    return kept
+
+
+def lod_tier(scalex, scaley=None):
+    """Picks the coarsest LOD tier whose error stays under LOD_ERROR_PX at this scale."""
+    if scaley is None:
+        scaley = scalex
+    scale = max(abs(scalex), abs(scaley))
+    tier = 0
+    while tier < MAX_LOD_TIER and scale <= 0.5 ** (tier + 1):
+        tier += 1
+    return tier
+
+
+def lod_tolerance(tier):
+    """Simplification tolerance, in shape units, for a tier (its nominal scale is 2 ** -tier)."""
+    return LOD_ERROR_PX * (2 ** tier)
+
+
+def lod_stroke(stroke, tier):
+    """
+    Returns the stroke simplified for a LOD tier, memoized in the stroke's cache.
+    Unfinished polygons and strokes RDP cannot reduce are returned unchanged.
+    """
+    if tier <= 0 or "points" not in stroke:
+        return stroke
+    if stroke["type"] == "polygon" and not stroke.get("finalized", False):
+        return stroke
+    pts = stroke["points"]
+    lods = stroke_cache(stroke).setdefault("lod", {})
+    cached = lods.get(tier)
+    if cached is not None and cached[0] is pts and cached[1] == len(pts):
+        return cached[2]
+    simple = simplify(pts, lod_tolerance(tier), closed=stroke["type"] != "freehand")
+    if simple is pts:
+        result = stroke
+    else:
+        result = {k: v for k, v in stroke.items() if k != "_cache"}
+        result["points"] = simple
+    lods[tier] = (pts, len(pts), result)
+    return result
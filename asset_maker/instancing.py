@@ -0,0 +1,124 @@
+import numpy as np
+from OpenGL.GL import *
+
+from asset_maker.mesh import get_mesh
+from asset_maker.geometry import lod_tier
+from asset_maker.shadow import get_shadow
+from asset_maker.culling import ClipSpace, visible_instances
+from utils.graphics import flush_batches
+
+# -------------------------------------------------
+# Instanced drawing of shapes that repeat across a level
+# -------------------------------------------------
+# The fixed-function pipeline has no per-instance attributes, so instances are
+# expanded on the CPU with numpy: every mesh batch is transformed for all of its
+# instances at once and submitted with a single glDrawArrays.
+#
+# Painter's order is kept between different shapes (in the order they were first
+# submitted) but not between instances of the same shape: batch k of every
+# instance is drawn before batch k+1 of any instance. That is fine for platforms,
+# coins and enemies, which do not overlap each other.
+#
+# Instances whose bounds land outside the viewport are dropped before expansion.
+
+
+class InstanceBatch:
+    """
+    Collects draw_at / draw_shadow_at calls for a frame and draws every shape type
+    in one pass. Same signatures as asset_maker.maker.draw_at / draw_shadow_at.
+    """
+
+    def __init__(self):
+        self.instances = {}   # mesh -> [(x, y, scalex, scaley), ...]
+        self.shadows = {}     # ShadowSprite -> [(x, y, scalex, scaley, color), ...]
+        self.draw_calls = 0
+        self.instance_count = 0
+
+    def draw_at(self, shape=None, x=0, y=0, scalex=1.0, scaley=None):
+        if scaley is None:
+            scaley = scalex
+        if shape is None:
+            return
+        mesh = get_mesh(shape, lod_tier(scalex, scaley))
+        self.instances.setdefault(mesh, []).append((x, y, scalex, scaley))
+
+    def draw_shadow_at(self, shape=None, x=0, y=0, scalex=1.0, scaley=None, alpha=0.3, color=(0,0,0,0.3)):
+        if scaley is None:
+            scaley = scalex
+        if shape is None:
+            return
+        sprite = get_shadow(get_mesh(shape), scalex, scaley)
+        if sprite is not None:
+            self.shadows.setdefault(sprite, []).append((x, y, scalex, scaley, color))
+
+    def flush(self):
+        """Draws everything queued since the last flush: all shadows first, then the shapes."""
+        flush_batches()
+        self.draw_calls = 0
+        self.instance_count = 0
+        clip = ClipSpace() if self.instances or self.shadows else None
+        for sprite, instances in self.shadows.items():
+            instances = self._visible(sprite.quad, instances, clip)
+            if instances:
+                self._draw_shadows(sprite, instances)
+        if self.instances:
+            glLineWidth(2.0)
+            glEnableClientState(GL_VERTEX_ARRAY)
+            glEnableClientState(GL_COLOR_ARRAY)
+            for mesh, instances in self.instances.items():
+                instances = self._visible(mesh.bounds, instances, clip)
+                self.instance_count += len(instances)
+                if instances:
+                    self._draw_mesh(mesh, instances)
+            glDisableClientState(GL_COLOR_ARRAY)
+            glDisableClientState(GL_VERTEX_ARRAY)
+        self.instances.clear()
+        self.shadows.clear()
+
+    @staticmethod
+    def _visible(bounds, instances, clip):
+        mask = visible_instances(bounds, [i[:4] for i in instances], clip)
+        if mask is None:
+            return instances
+        return [i for i, keep in zip(instances, mask) if keep]
+
+    def _draw_mesh(self, mesh, instances):
+        if not mesh.batches:
+            return
+        transforms = np.array(instances, dtype=np.float32)
+        offsets = transforms[:, None, 0:2]
+        scales = transforms[:, None, 2:4]
+        count = len(instances)
+        for mode, first, n in mesh.batches:
+            verts = mesh.data[first:first + n]
+            positions = (verts[None, :, 0:2] * scales + offsets).reshape(-1, 2)
+            colors = np.broadcast_to(verts[None, :, 2:5], (count, n, 3)).reshape(-1, 3)
+            glVertexPointer(2, GL_FLOAT, 0, np.ascontiguousarray(positions))
+            glColorPointer(3, GL_FLOAT, 0, np.ascontiguousarray(colors))
+            glDrawArrays(mode, 0, count * n)
+            self.draw_calls += 1
+
+    def _draw_shadows(self, sprite, instances):
+        left, top, right, bottom = sprite.quad
+        corners = np.array([(left, top), (right, top), (right, bottom), (left, bottom)], dtype=np.float32)
+        texcoords = np.array([(0.0, 1.0), (1.0, 1.0), (1.0, 0.0), (0.0, 0.0)], dtype=np.float32)
+        transforms = np.array([i[:4] for i in instances], dtype=np.float32)
+        positions = corners[None, :, :] * transforms[:, None, 2:4] + transforms[:, None, 0:2]
+        colors = np.repeat(np.array([i[4] for i in instances], dtype=np.float32), 4, axis=0)
+        count = len(instances)
+
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, sprite.texture)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glVertexPointer(2, GL_FLOAT, 0, np.ascontiguousarray(positions.reshape(-1, 2)))
+        glTexCoordPointer(2, GL_FLOAT, 0, np.ascontiguousarray(np.tile(texcoords, (count, 1))))
+        glColorPointer(4, GL_FLOAT, 0, colors)
+        glDrawArrays(GL_QUADS, 0, count * 4)
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+        self.draw_calls += 1
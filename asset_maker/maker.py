@@ -1,28 +1,49 @@
+import os
 import sys
 import math
 import json
 import time
+import numpy as np
 import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
+if __package__ in (None, ""):
+    # Running the editor directly as asset_maker/maker.py: make the project importable.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asset_maker.mesh import ShapeList, get_mesh
+from asset_maker.geometry import fill_index_array, lod_tier, point_array, shape_bounds, stroke_bounds, union_bounds
+from asset_maker.culling import CULLED, PARTIAL, shape_visible
+from asset_maker.shadow import draw_baked_shadow
+from asset_maker.shape_format import binary_path, read_binary
+from asset_maker.optimize import (DEFAULT_PRECISION, DEFAULT_TOLERANCE, optimize_shapes,
+                                  serializable_shapes, vertex_count)
+from utils.graphics import flush_batches
+
 # -------------------------------------------------
 # Window Setup
 # -------------------------------------------------
 WIDTH, HEIGHT = 800, 600
 
-pygame.init()
-pygame.display.set_caption("Freehand Drawing, Shapes, Fill, Undo/Redo, Erase, and Save/Load")
-pygame.display.set_mode((WIDTH, HEIGHT), DOUBLEBUF | OPENGL)
 
-# Set up an orthographic projection with (0,0) at the TOP-LEFT.
-glMatrixMode(GL_PROJECTION)
-glLoadIdentity()
-gluOrtho2D(0, WIDTH, HEIGHT, 0)  # Top-left is (0,0); y increases downward.
-glMatrixMode(GL_MODELVIEW)
-glLoadIdentity()
-glClearColor(1.0, 1.0, 1.0, 1.0)  # White background
+def init_window():
+    """
+    Opens the editor window. Only the editor needs it: the games import this module
+    for its drawing and loading functions and set up their own window (or none, headless).
+    """
+    pygame.init()
+    pygame.display.set_caption("Freehand Drawing, Shapes, Fill, Undo/Redo, Erase, and Save/Load")
+    pygame.display.set_mode((WIDTH, HEIGHT), DOUBLEBUF | OPENGL)
+
+    # Set up an orthographic projection with (0,0) at the TOP-LEFT.
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    gluOrtho2D(0, WIDTH, HEIGHT, 0)  # Top-left is (0,0); y increases downward.
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    glClearColor(1.0, 1.0, 1.0, 1.0)  # White background
 
 # -------------------------------------------------
 # Global Drawing State
@@ -88,36 +109,38 @@ ERASE_THRESHOLD = 5
 # -------------------------------------------------
 # Helper Functions for Shape Saving/Loading
 # -------------------------------------------------
-def save_shapes(filename, shapes):
+def save_shapes(filename, shapes, tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION):
     """
     Saves the shapes (list of dictionaries) to a JSON file.
     Tuples (points and colors) are converted to lists for JSON serialization.
+    The points are optimised on the way out (see asset_maker/optimize.py): collinear
+    points dropped, outlines simplified within tolerance and coordinates rounded to
+    precision decimals. Pass tolerance=None, precision=None to save them as drawn.
     """
-    shapes_serializable = []
-    for shape in shapes:
-        shape_copy = {}
-        for key, value in shape.items():
-            if key == "points":
-                shape_copy["points"] = [list(pt) for pt in value]
-            elif key == "fixed_points":
-                shape_copy["fixed_points"] = [list(pt) for pt in value]
-            elif key in ("line_color", "fill_color"):
-                shape_copy[key] = list(value) if value is not None else None
-            else:
-                shape_copy[key] = value
-        shapes_serializable.append(shape_copy)
+    optimized = shapes
+    if tolerance is not None or precision is not None:
+        optimized = optimize_shapes(shapes, tolerance, precision)
     with open(filename, "w") as f:
-        json.dump(shapes_serializable, f)
-    print(f"Saved {len(shapes)} shape(s) to '{filename}'.")
+        json.dump(serializable_shapes(optimized), f)
+    print(f"Saved {len(shapes)} shape(s) to '{filename}' "
+          f"({vertex_count(shapes)} -> {vertex_count(optimized)} vertices).")
 
-def load_shapes(filename):
+def load_shapes(filename, prefer_binary=True):
     """
-    Loads shapes from a JSON file.
-    The data is converted back into the proper format (tuples for points and colors).
+    Loads shapes from a JSON file, or from its .shpb if that is up to date
+    (see asset_maker/shape_format.py; the editor passes prefer_binary=False to keep
+    the JSON's full precision). Points end up as float32 arrays, fills are
+    triangulated and bounding boxes measured once here, for drawing and culling.
     """
+    shapes_data = read_binary(filename) if prefer_binary else None
+    if shapes_data is not None:
+        shapes_loaded = ShapeList(shapes_data, source=filename)
+        shapes_loaded.bounds = union_bounds([stroke_bounds(shape) for shape in shapes_loaded])
+        print(f"Loaded {len(shapes_loaded)} shape(s) from '{binary_path(filename)}'.")
+        return shapes_loaded
     with open(filename, "r") as f:
         shapes_data = json.load(f)
-    shapes_loaded = []
+    shapes_loaded = ShapeList(source=filename)
     for shape in shapes_data:
         if "points" in shape:
             shape["points"] = [tuple(pt) for pt in shape["points"]]
@@ -126,7 +149,12 @@ def load_shapes(filename):
         shape["line_color"] = tuple(shape["line_color"])
         if "fill_color" in shape and shape["fill_color"] is not None:
             shape["fill_color"] = tuple(shape["fill_color"])
+        if "points" in shape:
+            point_array(shape)
+        if shape.get("filled", False) and "points" in shape:
+            fill_index_array(shape)
         shapes_loaded.append(shape)
+    shapes_loaded.bounds = union_bounds([stroke_bounds(shape) for shape in shapes_loaded])
     print(f"Loaded {len(shapes_loaded)} shape(s) from '{filename}'.")
     return shapes_loaded
 
@@ -223,27 +251,34 @@ def generate_star_points(cx, cy, outer_radius, inner_radius, num_points=5):
 # -------------------------------------------------
 # Drawing Functions
 # -------------------------------------------------
+def _draw_points(mode, points, indices=None):
+    """Draws a float32 (n, 2) point array from client memory, optionally indexed."""
+    glBindBuffer(GL_ARRAY_BUFFER, 0)
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glVertexPointer(2, GL_FLOAT, 0, points)
+    if indices is None:
+        glDrawArrays(mode, 0, len(points))
+    elif len(indices):
+        glDrawElements(mode, len(indices), GL_UNSIGNED_INT, indices)
+    glDisableClientState(GL_VERTEX_ARRAY)
+
 def draw_stroke(stroke):
     """
     Draws a shape/stroke. If stroke is marked as filled, a filled polygon is drawn first;
     then the stroke outline is drawn on top.
+    Points come from the stroke's cached float32 array, so each part is one GL draw call.
     """
+    flush_batches()
     if stroke["type"] == "polygon":
         # For polygon mode, only fill if the polygon is finalized.
         if stroke.get("finalized", False):
-            pts = stroke["points"]
+            points = point_array(stroke)
             if stroke.get("filled", False) and stroke.get("fill_color"):
                 glColor3f(*stroke["fill_color"])
-                glBegin(GL_POLYGON)
-                for (x, y) in pts:
-                    glVertex2f(x, y)
-                glEnd()
+                _draw_points(GL_TRIANGLES, points, fill_index_array(stroke))
             glColor3f(*stroke["line_color"])
             glLineWidth(2.0)
-            glBegin(GL_LINE_LOOP)
-            for (x, y) in pts:
-                glVertex2f(x, y)
-            glEnd()
+            _draw_points(GL_LINE_LOOP, points)
         else:
             # Incomplete polygon: draw fixed points plus preview point if available.
             pts = stroke.get("fixed_points", [])
@@ -253,35 +288,31 @@ def draw_stroke(stroke):
                 return
             glColor3f(*stroke["line_color"])
             glLineWidth(2.0)
-            glBegin(GL_LINE_STRIP)
-            for (x, y) in pts:
-                glVertex2f(x, y)
-            glEnd()
+            _draw_points(GL_LINE_STRIP, np.array(pts, dtype=np.float32))
         return
 
     pts = stroke["points"]
     if len(pts) < 2:
         return
+    points = point_array(stroke)
 
-    # Draw filled polygon if applicable
+    # Draw filled polygon if applicable (triangulated, so concave outlines fill correctly)
     if stroke.get("filled", False) and stroke.get("fill_color"):
         glColor3f(*stroke["fill_color"])
-        glBegin(GL_POLYGON)
-        for (x, y) in pts:
-            glVertex2f(x, y)
-        glEnd()
+        _draw_points(GL_TRIANGLES, points, fill_index_array(stroke))
 
     # Draw stroke outline
     glColor3f(*stroke["line_color"])
     glLineWidth(2.0)
-    glBegin(GL_LINE_LOOP if stroke["type"] != "freehand" else GL_LINE_STRIP)
-    for (x, y) in pts:
-        glVertex2f(x, y)
-    glEnd()
+    _draw_points(GL_LINE_LOOP if stroke["type"] != "freehand" else GL_LINE_STRIP, points)
 
-def draw_at(shape=None, x=0, y=0, scalex=1.0, scaley=None):
+def draw_at(shape=None, x=0, y=0, scalex=1.0, scaley=None, clip=None):
     """
     Draws a shape (stroke) at the specified position (x, y) with a given scale.
+    The shape is compiled into a ShapeMesh on first use and drawn from its buffer.
+    Small scales use a simplified LOD tier of the shape (see geometry.lod_tier).
+    Given a culling.ClipSpace (captured once for many draws), shapes that would land
+    outside the viewport are skipped; without one the shape is simply drawn.
     """
     if scaley is None:
         scaley = scalex
@@ -289,12 +320,12 @@ def draw_at(shape=None, x=0, y=0, scalex=1.0, scaley=None):
     if shape is None:
         return
 
-    for stroke in shape:
-        glPushMatrix()
-        glTranslatef(x, y, 0.0)
-        glScalef(scalex, scaley, 1.0)
-        draw_stroke(stroke)
-        glPopMatrix()
+    visibility = shape_visible(shape_bounds(shape), x, y, scalex, scaley, clip)
+    if visibility == CULLED:
+        return
+    # only a shape that straddles the edge needs its batches tested one by one
+    mesh = get_mesh(shape, lod_tier(scalex, scaley))
+    mesh.draw(x, y, scalex, scaley, clip if visibility == PARTIAL else None)
 
 def draw_shadow_stroke(stroke, color=(0,0,0,0.3)):
     """
@@ -307,15 +338,18 @@ def draw_shadow_stroke(stroke, color=(0,0,0,0.3)):
     if len(pts) < 2:
         return
 
+    flush_batches()
     glColor4f(*color)
-    glBegin(GL_POLYGON if stroke.get("filled", False) else GL_LINE_LOOP)
-    for (x, y) in pts:
-        glVertex2f(x, y)
-    glEnd()
+    if stroke.get("filled", False):
+        _draw_points(GL_TRIANGLES, point_array(stroke), fill_index_array(stroke))
+        return
+    _draw_points(GL_LINE_LOOP, point_array(stroke))
 
-def draw_shadow_at(shape=None, x=0, y=0, scalex=1.0, scaley=None, alpha=0.3, color=(0,0,0,0.3)):
+def draw_shadow_at(shape=None, x=0, y=0, scalex=1.0, scaley=None, alpha=0.3, color=(0,0,0,0.3), clip=None):
     """
     Draws a shape (list of strokes) at the specified position (x, y) as a transparent black shadow.
+    The silhouette is baked into an alpha texture once per shape and scale, so each call
+    draws a single textured quad. clip culls it as in draw_at.
     """
     if scaley is None:
         scaley = scalex
@@ -323,13 +357,9 @@ def draw_shadow_at(shape=None, x=0, y=0, scalex=1.0, scaley=None, alpha=0.3, col
     if shape is None:
         return
 
-    for stroke in shape:
-        glPushMatrix()
-        glTranslatef(x, y, 0.0)
-        glScalef(scalex, scaley, 1.0)
-        glColor4f(*color)
-        draw_shadow_stroke(stroke, color=color)
-        glPopMatrix()
+    if shape_visible(shape_bounds(shape), x, y, scalex, scaley, clip) == CULLED:
+        return
+    draw_baked_shadow(get_mesh(shape), x, y, scalex, scaley, color)
 
 def draw_palette():
     """
@@ -380,6 +410,7 @@ def main():
     global current_color, draw_mode
     global start_x, start_y
 
+    init_window()
     clock = pygame.time.Clock()
 
     while True:
@@ -575,7 +606,7 @@ def main():
                 elif event.key == K_x:
                     file_path = input("Enter file path to load shapes: ")
                     if file_path:
-                        strokes[:] = load_shapes(file_path)
+                        strokes[:] = load_shapes(file_path, prefer_binary=False)
                         undo_stack.clear()
                 elif event.key == K_f:
                     draw_mode = "freehand"
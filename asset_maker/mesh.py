@@ -0,0 +1,386 @@
+import ctypes
+import weakref
+from collections import OrderedDict
+import numpy as np
+from OpenGL.GL import *
+
+from utils.graphics import flush_batches
+
+from asset_maker.geometry import fill_indices, lod_stroke, stroke_bounds, union_bounds
+from asset_maker.shape import Shape
+from asset_maker.culling import count_batches, culling_enabled, place_boxes
+
+# -------------------------------------------------
+# ShapeMesh: a shape list compiled into one vertex buffer
+# -------------------------------------------------
+# Every vertex is stored as (x, y, r, g, b) float32.
+VERTEX_FLOATS = 5
+VERTEX_STRIDE = VERTEX_FLOATS * 4
+
+# Outlines are drawn 2px wide, so their bounds are padded a little when
+# deciding whether two primitives may be reordered.
+LINE_PAD = 2.0
+
+
+def _outline_segments(pts, closed):
+    """Turns a line strip/loop into independent GL_LINES segments."""
+    segments = []
+    for i in range(len(pts) - 1):
+        segments.append(pts[i])
+        segments.append(pts[i + 1])
+    if closed and len(pts) > 2:
+        segments.append(pts[-1])
+        segments.append(pts[0])
+    return segments
+
+
+def _fill_triangles(stroke):
+    """The stroke's fill as a triangle list, using the triangles cached at load time."""
+    pts = stroke["points"]
+    return [pts[i] for i in fill_indices(stroke)]
+
+
+def _bounds(pts, pad=0.0):
+    xs = [p[0] for p in pts]
+    ys = [p[1] for p in pts]
+    return (min(xs) - pad, min(ys) - pad, max(xs) + pad, max(ys) + pad)
+
+
+def _overlaps(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def stroke_primitives(stroke):
+    """
+    Returns the (mode, vertices, color) primitives draw_stroke would submit for a stroke,
+    in the same order, with fills as GL_TRIANGLES and outlines as GL_LINES.
+    """
+    prims = []
+    if stroke["type"] == "polygon" and not stroke.get("finalized", False):
+        pts = list(stroke.get("fixed_points", []))
+        if "preview" in stroke:
+            pts = pts + [stroke["preview"]]
+        if len(pts) >= 2:
+            prims.append((GL_LINES, _outline_segments(pts, False), stroke["line_color"]))
+        return prims
+
+    pts = stroke["points"]
+    if stroke["type"] != "polygon" and len(pts) < 2:
+        return prims
+
+    if stroke.get("filled", False) and stroke.get("fill_color"):
+        tris = _fill_triangles(stroke)
+        if tris:
+            prims.append((GL_TRIANGLES, tris, stroke["fill_color"]))
+    segments = _outline_segments(pts, stroke["type"] != "freehand")
+    if segments:
+        prims.append((GL_LINES, segments, stroke["line_color"]))
+    return prims
+
+
+def shadow_primitives(stroke):
+    """Returns the (mode, vertices) primitives draw_shadow_stroke would submit."""
+    if not stroke or "points" not in stroke:
+        return []
+    pts = stroke["points"]
+    if len(pts) < 2:
+        return []
+    if stroke.get("filled", False):
+        tris = _fill_triangles(stroke)
+        return [(GL_TRIANGLES, tris)] if tris else []
+    return [(GL_LINES, _outline_segments(pts, True))]
+
+
+def _batch(prims):
+    """
+    Groups primitives into as few (mode, [prims]) batches as possible while keeping
+    painter's order: a primitive may only be moved ahead of an earlier primitive of a
+    different mode when their bounds do not overlap.
+    """
+    batches = []
+    placed = []  # (batch index, mode, bounds) of every primitive placed so far
+    for prim in prims:
+        mode, bounds = prim[0], prim[-1]
+        lowest = 0
+        for index, other_mode, other_bounds in placed:
+            if _overlaps(bounds, other_bounds):
+                lowest = max(lowest, index if other_mode == mode else index + 1)
+        target = None
+        for index in range(lowest, len(batches)):
+            if batches[index][0] == mode:
+                target = index
+                break
+        if target is None:
+            target = len(batches)
+            batches.append((mode, []))
+        batches[target][1].append(prim)
+        placed.append((target, mode, bounds))
+    return batches
+
+
+class ShapeMesh:
+    """
+    A shape list compiled once into a GPU vertex buffer, so drawing it costs a handful of
+    glDrawArrays calls instead of one glVertex2f call per point.
+    """
+
+    def __init__(self, shape, label=None):
+        self.label = label
+        prims = []
+        shadow_prims = []
+        shadow_bounds = []
+        self.legacy_calls = 0
+        self.stroke_count = len(shape)
+        for stroke in shape:
+            for mode, verts, color in stroke_primitives(stroke):
+                pad = LINE_PAD if mode == GL_LINES else 0.0
+                prims.append((mode, verts, color, _bounds(verts, pad)))
+            for mode, verts in shadow_primitives(stroke):
+                shadow_prims.append((mode, verts, None))
+                shadow_bounds.append(_bounds(verts, LINE_PAD if mode == GL_LINES else 0.0))
+            self.legacy_calls += _legacy_call_count(stroke)
+
+        data = []
+        self.batches = self._pack(_batch(prims), data)
+        # The shadow is a single colour, so blending order between its primitives
+        # does not matter: one batch per mode is enough.
+        shadow_batches = [(mode, [p for p in shadow_prims if p[0] == mode])
+                          for mode in (GL_TRIANGLES, GL_LINES)]
+        self.shadow_batches = self._pack([b for b in shadow_batches if b[1]], data)
+
+        # Local-space box around the shadow geometry, used when baking it to a texture.
+        self.shadow_bounds = None
+        if shadow_bounds:
+            self.shadow_bounds = (min(b[0] for b in shadow_bounds), min(b[1] for b in shadow_bounds),
+                                  max(b[2] for b in shadow_bounds), max(b[3] for b in shadow_bounds))
+        self.shadows = {}
+
+        self.vertex_count = len(data)
+        self.vbo = None
+        self.data = np.array(data, dtype=np.float32).reshape(-1, VERTEX_FLOATS)
+        # local box of every batch, so a partly visible mesh can skip the rest
+        self.batch_bounds = np.array([self._range_bounds(first, n) for _, first, n in self.batches],
+                                     dtype=np.float64).reshape(-1, 4)
+        self.bounds = union_bounds(self.batch_bounds.tolist())
+        _live_meshes.add(self)
+
+    def _pack(self, batches, data):
+        ranges = []
+        for mode, prims in batches:
+            first = len(data)
+            for prim in prims:
+                color = prim[2] or (0.0, 0.0, 0.0)
+                r, g, b = color[0], color[1], color[2]
+                for (x, y) in prim[1]:
+                    data.append((x, y, r, g, b))
+            ranges.append((mode, first, len(data) - first))
+        return ranges
+
+    def _range_bounds(self, first, n):
+        xy = self.data[first:first + n, 0:2]
+        low, high = xy.min(axis=0), xy.max(axis=0)
+        return (low[0], low[1], high[0], high[1])
+
+    @property
+    def draw_calls(self):
+        return len(self.batches)
+
+    def upload(self):
+        """Uploads the vertex data to a GL buffer (needs a current GL context)."""
+        if self.vbo is not None or self.vertex_count == 0:
+            return
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.data.nbytes, self.data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def release(self):
+        """Deletes the GL buffer and baked shadows; they are rebuilt on the next draw."""
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+        self.release_shadows()
+
+    def release_shadows(self):
+        for sprite in self.shadows.values():
+            if sprite is not None:
+                sprite.release()
+        self.shadows.clear()
+
+    def _draw_ranges(self, ranges, x, y, scalex, scaley, with_color):
+        if not ranges:
+            return
+        flush_batches()
+        self.upload()
+        glPushMatrix()
+        glTranslatef(x, y, 0.0)
+        glScalef(scalex, scaley, 1.0)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(2, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(0))
+        if with_color:
+            glEnableClientState(GL_COLOR_ARRAY)
+            glColorPointer(3, GL_FLOAT, VERTEX_STRIDE, ctypes.c_void_p(8))
+        for mode, first, count in ranges:
+            glDrawArrays(mode, first, count)
+        if with_color:
+            glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glPopMatrix()
+
+    def draw(self, x=0, y=0, scalex=1.0, scaley=1.0, clip=None):
+        """Draws the mesh; given a culling.ClipSpace, batches outside the viewport are skipped."""
+        ranges = self.batches
+        if clip is not None and len(ranges) > 1 and culling_enabled():
+            visible = clip.visible(place_boxes(self.batch_bounds, (x, y, scalex, scaley)))
+            ranges = [r for r, keep in zip(ranges, visible) if keep]
+        count_batches(len(ranges), len(self.batches) - len(ranges))
+        glLineWidth(2.0)
+        self._draw_ranges(ranges, x, y, scalex, scaley, True)
+
+    def draw_shadow(self, x=0, y=0, scalex=1.0, scaley=1.0, color=(0, 0, 0, 0.3)):
+        """Draws the shadow geometry directly (used to bake the shadow textures)."""
+        glColor4f(*color)
+        self._draw_ranges(self.shadow_batches, x, y, scalex, scaley, False)
+
+    def stats(self):
+        return {
+            "shape": self.label,
+            "strokes": self.stroke_count,
+            "vertices": self.vertex_count,
+            "draw_calls": self.draw_calls,
+            "legacy_gl_calls": self.legacy_calls,
+        }
+
+
+def _legacy_call_count(stroke):
+    """Number of GL calls the immediate-mode draw_at/draw_stroke path made for a stroke."""
+    calls = 4  # push, translate, scale, pop
+    if stroke["type"] == "polygon" and not stroke.get("finalized", False):
+        n = len(stroke.get("fixed_points", [])) + (1 if "preview" in stroke else 0)
+        return calls + (4 + n if n >= 2 else 0)
+    n = len(stroke["points"])
+    if stroke["type"] != "polygon" and n < 2:
+        return calls
+    if stroke.get("filled", False) and stroke.get("fill_color"):
+        calls += 3 + n  # glColor, glBegin, glVertex per point, glEnd
+    return calls + 4 + n  # glColor, glLineWidth, glBegin, glVertex per point, glEnd
+
+
+# -------------------------------------------------
+# Mesh cache
+# -------------------------------------------------
+class ShapeList(list):
+    """
+    A list of strokes as returned by load_shapes. It remembers the file it came from
+    and owns its compiled meshes (one per LOD tier in use), whose GL buffers are freed
+    when the shape goes away. bounds is the box around all strokes, set by load_shapes.
+    Unlike a Shape it may be edited; get_mesh notices and rebuilds (see _content_key).
+    """
+    __slots__ = ("source", "meshes", "bounds", "content", "__weakref__")
+
+    def __init__(self, strokes=(), source=None):
+        super().__init__(strokes)
+        self.source = source
+        self.meshes = {}
+        self.bounds = None
+        self.content = None   # _content_key() the meshes were built from
+
+
+_live_meshes = weakref.WeakSet()
+
+# Plain lists built elsewhere cannot carry their meshes or be weakly referenced, so
+# the most recently drawn ones are cached here by id (holding the list, so that the
+# id is not reused while cached). The least recently drawn are dropped past the
+# limit, and their GL buffers freed.
+PLAIN_MESH_LIMIT = 32
+_plain_meshes = OrderedDict()   # id -> (list, _content_key, {tier: mesh})
+
+
+def _release_meshes(meshes):
+    for mesh in set(meshes.values()):
+        mesh.release()
+    meshes.clear()
+
+
+def _content_key(shape):
+    """
+    What the meshes of an editable stroke list are built from: each stroke and its
+    point list (by identity), the point counts and the colour and fill settings.
+    Adding, removing or replacing strokes, assigning or appending points and changing
+    colours or fills all change it; overwriting a point in place does not, so code
+    that moves points should assign the stroke a new point list.
+    """
+    return [(stroke, stroke.get("points"), len(stroke.get("points", ())),
+             len(stroke.get("fixed_points", ())), stroke.get("line_color"), stroke.get("filled"),
+             stroke.get("fill_color"), stroke.get("finalized"))
+            for stroke in shape]
+
+
+def _same_content(a, b):
+    return (a is not None and len(a) == len(b) and
+            all(x[0] is y[0] and x[1] is y[1] and x[2:] == y[2:] for x, y in zip(a, b)))
+
+
+def _build_mesh(shape, tier, meshes, label):
+    """Builds the mesh for a LOD tier, sharing the finer tier's mesh when RDP dropped nothing."""
+    if tier == 0:
+        return ShapeMesh(shape, label)
+    strokes = [lod_stroke(stroke, tier) for stroke in shape]
+    finer = [lod_stroke(stroke, tier - 1) for stroke in shape]
+    if all(len(a.get("points", ())) == len(b.get("points", ())) for a, b in zip(strokes, finer)):
+        return _mesh_for(shape, tier - 1, meshes, label)
+    return ShapeMesh(strokes, f"{label}@lod{tier}" if label else None)
+
+
+def _mesh_for(shape, tier, meshes, label):
+    mesh = meshes.get(tier)
+    if mesh is None:
+        mesh = meshes[tier] = _build_mesh(shape, tier, meshes, label)
+    return mesh
+
+
+def get_mesh(shape, tier=0):
+    """
+    Returns the compiled ShapeMesh for a shape list at a LOD tier (0 = full detail),
+    building it on first use.
+    """
+    if isinstance(shape, Shape):
+        if not shape.meshes:
+            weakref.finalize(shape, _release_meshes, shape.meshes).atexit = False
+        return _mesh_for(shape, tier, shape.meshes, shape.source)
+    content = _content_key(shape)
+    if isinstance(shape, ShapeList):
+        if not _same_content(shape.content, content):
+            if shape.content is None:
+                weakref.finalize(shape, _release_meshes, shape.meshes).atexit = False
+            else:
+                # edited since its meshes were built: drop them and re-measure
+                _release_meshes(shape.meshes)
+                shape.bounds = union_bounds([stroke_bounds(stroke) for stroke in shape])
+            shape.content = content
+        return _mesh_for(shape, tier, shape.meshes, shape.source)
+    entry = _plain_meshes.get(id(shape))
+    if entry is None or entry[0] is not shape:
+        entry = _plain_meshes[id(shape)] = (shape, content, {})
+        while len(_plain_meshes) > PLAIN_MESH_LIMIT:
+            _release_meshes(_plain_meshes.popitem(last=False)[1][2])
+    else:
+        _plain_meshes.move_to_end(id(shape))
+        if not _same_content(entry[1], content):
+            _release_meshes(entry[2])
+            entry = _plain_meshes[id(shape)] = (shape, content, {})
+    return _mesh_for(shape, tier, entry[2], None)
+
+
+def mesh_stats():
+    """Per-shape vertex and draw-call counts for every mesh currently alive."""
+    return [mesh.stats() for mesh in _live_meshes]
+
+
+def print_mesh_stats():
+    print(f"{'shape':40s} {'strokes':>7s} {'verts':>7s} {'draws':>6s} {'legacy GL calls':>16s}")
+    for s in sorted(mesh_stats(), key=lambda s: str(s["shape"])):
+        print(f"{str(s['shape']):40s} {s['strokes']:7d} {s['vertices']:7d} "
+              f"{s['draw_calls']:6d} {s['legacy_gl_calls']:16d}")
@@ -0,0 +1,169 @@
+import os
+import sys
+import json
+import argparse
+
+if __package__ in (None, ""):
+    # Running the batch mode directly as asset_maker/optimize.py: make the project importable.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asset_maker.geometry import EPSILON, simplify
+
+# -------------------------------------------------
+# Export-time geometry optimisation (no GL calls in here)
+# -------------------------------------------------
+# Freehand strokes get a point on every mouse motion, most of them on a straight
+# line or a pixel away from the last one. Before a shape is written out its points
+# go through: exact duplicates and collinear points dropped, Ramer-Douglas-Peucker
+# simplification within a tolerance, and coordinates rounded to a few decimals.
+#
+# Tolerances are in shape units (pixels of the editor canvas).
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_PRECISION = 2
+# How far off the line through its neighbours a point may be and still count as collinear.
+COLLINEAR_EPSILON = 1e-6
+
+SHAPE_FOLDERS = ("assets/shapes", "assets/objects")
+
+
+def remove_collinear(pts, closed=False, epsilon=COLLINEAR_EPSILON):
+    """
+    Drops repeated points and points lying on the straight segment between their
+    neighbours. Open strokes keep both ends; closed outlines keep at least 3 points.
+    """
+    out = []
+    for pt in pts:
+        if out and abs(out[-1][0] - pt[0]) <= EPSILON and abs(out[-1][1] - pt[1]) <= EPSILON:
+            continue
+        out.append(pt)
+    if closed and len(out) > 1 and abs(out[0][0] - out[-1][0]) <= EPSILON and abs(out[0][1] - out[-1][1]) <= EPSILON:
+        out.pop()
+
+    def between(a, b, c):
+        # b on segment a-c: tiny cross product and pointing the same way
+        abx, aby = b[0] - a[0], b[1] - a[1]
+        bcx, bcy = c[0] - b[0], c[1] - b[1]
+        length = ((c[0] - a[0]) ** 2 + (c[1] - a[1]) ** 2) ** 0.5
+        cross = abx * bcy - aby * bcx
+        return abs(cross) <= epsilon * max(length, 1.0) and abx * bcx + aby * bcy >= 0.0
+
+    kept = []
+    for pt in out:
+        while len(kept) >= 2 and between(kept[-2], kept[-1], pt):
+            kept.pop()
+        kept.append(pt)
+    if closed:
+        # the seam between the last and the first point
+        while len(kept) > 3 and between(kept[-2], kept[-1], kept[0]):
+            kept.pop()
+        while len(kept) > 3 and between(kept[-1], kept[0], kept[1]):
+            kept.pop(0)
+        if len(kept) < 3:
+            return out  # degenerate outline, leave it as drawn
+    return kept
+
+
+def optimize_points(pts, closed, tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION):
+    """Collinear removal, RDP within tolerance (None or 0 skips it) and rounding."""
+    pts = remove_collinear([tuple(pt) for pt in pts], closed)
+    if tolerance:
+        pts = list(simplify(pts, tolerance, closed))
+    if precision is not None:
+        pts = [(round(x, precision), round(y, precision)) for x, y in pts]
+        pts = remove_collinear(pts, closed)
+    return pts
+
+
+def optimize_stroke(stroke, tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION):
+    """A copy of a stroke dict with its points optimised; unfinished polygons are left alone."""
+    result = {k: v for k, v in stroke.items() if not k.startswith("_")}
+    if stroke["type"] == "polygon" and not stroke.get("finalized", False):
+        return result
+    if len(stroke.get("points", ())) < 3:
+        if precision is not None and "points" in stroke:
+            result["points"] = [(round(x, precision), round(y, precision)) for x, y in stroke["points"]]
+        return result
+    result["points"] = optimize_points(stroke["points"], stroke["type"] != "freehand", tolerance, precision)
+    if "fixed_points" in stroke:
+        # a finalized polygon's fixed points are its outline
+        result["fixed_points"] = list(result["points"])
+    return result
+
+
+def optimize_shapes(shapes, tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION):
+    return [optimize_stroke(stroke, tolerance, precision) for stroke in shapes]
+
+
+def vertex_count(shapes):
+    return sum(len(stroke.get("points", ())) + len(stroke.get("fixed_points", ())) for stroke in shapes)
+
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def serializable_shapes(shapes):
+    """Shapes as plain JSON data: derived "_" keys dropped, tuples turned into lists."""
+    shapes_serializable = []
+    for shape in shapes:
+        shape_copy = {}
+        for key, value in shape.items():
+            if key.startswith("_"):
+                continue  # derived data such as cached triangles
+            if key in ("points", "fixed_points"):
+                shape_copy[key] = [[_number(x), _number(y)] for x, y in value]
+            elif key in ("line_color", "fill_color"):
+                shape_copy[key] = list(value) if value is not None else None
+            else:
+                shape_copy[key] = value
+        shapes_serializable.append(shape_copy)
+    return shapes_serializable
+
+
+def optimize_file(filename, tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION, write=True):
+    """
+    Re-optimises a shape JSON file in place (unless write is False).
+    Returns (vertices before, vertices after, bytes before, bytes after).
+    """
+    with open(filename, "r") as f:
+        shapes = json.load(f)
+    optimized = optimize_shapes(shapes, tolerance, precision)
+    data = json.dumps(serializable_shapes(optimized))
+    before = os.path.getsize(filename)
+    if write:
+        tmp = f"{filename}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, filename)
+    return vertex_count(shapes), vertex_count(optimized), before, len(data.encode("utf-8"))
+
+
+def optimize_folders(folders=SHAPE_FOLDERS, tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION, write=True):
+    """Runs optimize_file over every .json in folders and prints what it saved."""
+    totals = [0, 0, 0, 0]
+    print(f"{'file':40s} {'vertices':>17s} {'bytes':>19s}")
+    for folder in folders:
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(".json"):
+                continue
+            filename = os.path.join(folder, name)
+            counts = optimize_file(filename, tolerance, precision, write)
+            totals = [t + c for t, c in zip(totals, counts)]
+            print(f"{filename:40s} {counts[0]:7d} -> {counts[1]:6d} {counts[2]:8d} -> {counts[3]:7d}")
+    v0, v1, b0, b1 = totals
+    print(f"{'total':40s} {v0:7d} -> {v1:6d} {b0:8d} -> {b1:7d}  "
+          f"({100.0 * (1 - v1 / max(v0, 1)):.0f}% fewer vertices, {100.0 * (1 - b1 / max(b0, 1)):.0f}% fewer bytes)")
+    return totals
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-optimise the shape files of the game.")
+    parser.add_argument("folders", nargs="*", default=list(SHAPE_FOLDERS))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="simplification tolerance in shape units (0 keeps every non-collinear point)")
+    parser.add_argument("--precision", type=int, default=DEFAULT_PRECISION,
+                        help="decimals kept in coordinates")
+    parser.add_argument("--dry-run", action="store_true", help="only print the savings")
+    args = parser.parse_args()
+    optimize_folders(args.folders, args.tolerance, args.precision, write=not args.dry_run)
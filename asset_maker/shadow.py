@@ -0,0 +1,142 @@
+import math
+import weakref
+import numpy as np
+from OpenGL.GL import *
+
+from utils.graphics import RenderTarget, flush_batches, textures
+
+# -------------------------------------------------
+# Baked silhouette shadows
+# -------------------------------------------------
+# Box-blur radius (in pixels) applied to shadows when they are baked; 0 keeps hard edges.
+SHADOW_BLUR = 0
+# Empty pixels kept around the silhouette so the edge (and the blur) is not clipped.
+SHADOW_PAD = 2
+
+# Baked textures are handed to the texture manager, so its report counts them.
+# Meshes of registry shapes live as long as the process, so the games drop their
+# shadows with release_shadows() when they are left; they are baked again on use.
+_meshes_with_shadows = weakref.WeakSet()
+
+
+def _box_blur(alpha, radius):
+    """Separable box blur of a uint8 alpha mask."""
+    if radius <= 0:
+        return alpha
+    size = 2 * radius + 1
+    img = alpha.astype(np.float32)
+    for axis in (0, 1):
+        padded = np.pad(img, [(radius, radius) if a == axis else (0, 0) for a in (0, 1)], mode="constant")
+        summed = np.cumsum(padded, axis=axis, dtype=np.float32)
+        summed = np.insert(summed, 0, 0.0, axis=axis)
+        if axis == 0:
+            img = (summed[size:, :] - summed[:-size, :]) / size
+        else:
+            img = (summed[:, size:] - summed[:, :-size]) / size
+    return np.clip(img, 0, 255).astype(np.uint8)
+
+
+class ShadowSprite:
+    """A shape's silhouette at one scale, stored as an alpha texture (owned by textures)."""
+
+    def __init__(self, texture, quad):
+        self.texture = texture
+        # (left, top, right, bottom) of the textured quad in the shape's local units
+        self.quad = quad
+
+    def draw(self, x, y, scalex, scaley, color):
+        left, top, right, bottom = self.quad
+        x0, x1 = x + left * scalex, x + right * scalex
+        y0, y1 = y + top * scaley, y + bottom * scaley
+
+        flush_batches()
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glColor4f(*color)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0.0, 1.0)
+        glVertex2f(x0, y0)
+        glTexCoord2f(1.0, 1.0)
+        glVertex2f(x1, y0)
+        glTexCoord2f(1.0, 0.0)
+        glVertex2f(x1, y1)
+        glTexCoord2f(0.0, 0.0)
+        glVertex2f(x0, y1)
+        glEnd()
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
+
+    def release(self):
+        if self.texture:
+            textures.release(self.texture)
+            self.texture = 0
+
+
+def bake_shadow(mesh, scalex, scaley, blur=SHADOW_BLUR):
+    """
+    Renders the mesh's shadow geometry once, in white, into an offscreen target at the
+    given (absolute) scale and keeps the alpha channel as a texture.
+    Returns None for shapes with nothing to cast a shadow.
+    """
+    if mesh.shadow_bounds is None:
+        return None
+    sx, sy = abs(scalex), abs(scaley)
+    if sx == 0 or sy == 0:
+        return None
+    min_x, min_y, max_x, max_y = mesh.shadow_bounds
+    pad = SHADOW_PAD + blur
+    width = int(math.ceil((max_x - min_x) * sx)) + 2 * pad
+    height = int(math.ceil((max_y - min_y) * sy)) + 2 * pad
+
+    target = RenderTarget(width, height)
+    blending = glIsEnabled(GL_BLEND)
+    glDisable(GL_BLEND)
+    target.begin(clear_color=(1.0, 1.0, 1.0, 0.0))
+    glLineWidth(2.0)
+    mesh.draw_shadow(pad - min_x * sx, pad - min_y * sy, sx, sy, color=(1.0, 1.0, 1.0, 1.0))
+    alpha = target.read_alpha()
+    target.end()
+    target.release()
+    if blending:
+        glEnable(GL_BLEND)
+
+    alpha = _box_blur(alpha, blur)
+
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_ALPHA8, width, height, 0, GL_ALPHA, GL_UNSIGNED_BYTE, alpha)
+    glBindTexture(GL_TEXTURE_2D, 0)
+
+    textures.adopt(texture, f"shadow of {mesh.label or 'shape'} @{sx:g}x{sy:g}", width * height)
+
+    left = min_x - pad / sx
+    top = min_y - pad / sy
+    return ShadowSprite(texture, (left, top, left + width / sx, top + height / sy))
+
+
+def get_shadow(mesh, scalex, scaley, blur=SHADOW_BLUR):
+    """Returns the baked shadow for a mesh at a scale, baking it on first use."""
+    key = (round(abs(scalex), 3), round(abs(scaley), 3), blur)
+    if key not in mesh.shadows:
+        mesh.shadows[key] = bake_shadow(mesh, key[0], key[1], blur)
+        _meshes_with_shadows.add(mesh)
+    return mesh.shadows[key]
+
+
+def release_shadows():
+    """Frees every baked shadow; each is baked again the next time it is drawn."""
+    for mesh in list(_meshes_with_shadows):
+        mesh.release_shadows()
+    _meshes_with_shadows.clear()
+
+
+def draw_baked_shadow(mesh, x, y, scalex, scaley, color=(0, 0, 0, 0.3)):
+    """Draws a mesh's shadow as one textured quad; negative scales mirror it."""
+    sprite = get_shadow(mesh, scalex, scaley)
+    if sprite is not None:
+        sprite.draw(x, y, scalex, scaley, color)
@@ -0,0 +1,165 @@
+import sys
+import numpy as np
+
+from asset_maker.geometry import fill_index_array, point_array, stroke_bounds, stroke_cache, union_bounds
+
+# -------------------------------------------------
+# Shared, read-only shapes (no GL calls in here)
+# -------------------------------------------------
+# load_shapes returns editable lists of stroke dicts, which is what the editor
+# needs. Games only ever draw their shapes, so the asset registry freezes each
+# file once into a Shape: slotted Stroke records whose points are read-only views
+# into one float32 array per file. Every entity that uses the file shares it.
+
+_MISSING = object()
+
+
+class Stroke:
+    """
+    An immutable stroke. It reads like the stroke dicts (stroke["points"],
+    stroke.get("filled"), "fixed_points" in stroke, items()) so everything that
+    draws dict strokes draws it as well; only its derived-data cache may be set.
+    Keys the source dict did not have are left out, as in the dict.
+    """
+    __slots__ = ("type", "points", "line_color", "filled", "fill_color",
+                 "fixed_points", "finalized", "_cache")
+    KEYS = ("type", "points", "line_color", "filled", "fill_color", "fixed_points", "finalized")
+
+    def __init__(self, kind, points, line_color, filled=_MISSING, fill_color=_MISSING,
+                 fixed_points=_MISSING, finalized=_MISSING):
+        set_slot = object.__setattr__
+        set_slot(self, "type", kind)
+        set_slot(self, "points", points)
+        set_slot(self, "line_color", line_color)
+        set_slot(self, "filled", filled)
+        set_slot(self, "fill_color", fill_color)
+        set_slot(self, "fixed_points", fixed_points)
+        set_slot(self, "finalized", finalized)
+        set_slot(self, "_cache", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Stroke is read-only")
+
+    def __getitem__(self, key):
+        value = getattr(self, key, _MISSING) if key in self.KEYS or key == "_cache" else _MISSING
+        if value is _MISSING or (key == "_cache" and value is None):
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key != "_cache":  # stroke_cache() stores triangles and LOD tiers here
+            raise TypeError("Stroke is read-only")
+        object.__setattr__(self, "_cache", value)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __contains__(self, key):
+        if key == "_cache":
+            return self._cache is not None
+        return key in self.KEYS and getattr(self, key) is not _MISSING
+
+    def keys(self):
+        return [key for key in self.KEYS if getattr(self, key) is not _MISSING]
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in self.keys()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+
+class Shape:
+    """
+    An immutable list of Strokes sharing one contiguous (n, 2) float32 coordinate
+    array. Draws like a ShapeList (draw_at, InstanceBatch) and owns its meshes.
+    """
+    __slots__ = ("source", "strokes", "coords", "meshes", "bounds", "__weakref__")
+
+    def __init__(self, strokes, coords, source=None):
+        self.source = source
+        self.strokes = tuple(strokes)
+        self.coords = coords
+        self.meshes = {}
+        self.bounds = union_bounds([stroke_bounds(stroke) for stroke in self.strokes])
+
+    @classmethod
+    def from_strokes(cls, strokes, source=None):
+        """Freezes loaded stroke dicts, keeping the fill triangles they already carry."""
+        arrays = [point_array(stroke) for stroke in strokes]
+        fixed = [point_array(stroke, "fixed_points") for stroke in strokes if "fixed_points" in stroke]
+        coords = np.concatenate(arrays + fixed) if arrays else np.zeros((0, 2), dtype=np.float32)
+        coords.setflags(write=False)
+
+        frozen = []
+        offset = len(coords) - sum(len(a) for a in fixed)
+        start = 0
+        for stroke, array in zip(strokes, arrays):
+            points = coords[start:start + len(array)]
+            start += len(array)
+            fixed_points = _MISSING
+            if "fixed_points" in stroke:
+                n = len(stroke["fixed_points"])
+                fixed_points = coords[offset:offset + n]
+                offset += n
+            fill_color = stroke.get("fill_color", _MISSING)
+            if fill_color is not _MISSING and fill_color is not None:
+                fill_color = tuple(fill_color)
+            frozen_stroke = Stroke(stroke["type"], points if "points" in stroke else _MISSING,
+                                   tuple(stroke["line_color"]),
+                                   stroke.get("filled", _MISSING), fill_color,
+                                   fixed_points, stroke.get("finalized", _MISSING))
+            if frozen_stroke.get("filled", False) and "points" in stroke:
+                indices = fill_index_array(stroke)
+                cache = stroke_cache(frozen_stroke)
+                cache["triangles"] = (points, len(points), indices)
+                cache["triangle_array"] = (indices, indices)
+            frozen.append(frozen_stroke)
+        return cls(frozen, coords, source)
+
+    def __len__(self):
+        return len(self.strokes)
+
+    def __iter__(self):
+        return iter(self.strokes)
+
+    def __getitem__(self, index):
+        return self.strokes[index]
+
+    def __repr__(self):
+        return f"<Shape {self.source!r}: {len(self.strokes)} strokes, {len(self.coords)} points>"
+
+    def nbytes(self):
+        """Memory held by the shape itself: records, coordinate array and fill indices."""
+        total = sys.getsizeof(self) + sys.getsizeof(self.strokes) + self.coords.nbytes
+        for stroke in self.strokes:
+            total += sys.getsizeof(stroke)
+            cached = (stroke.get("_cache") or {}).get("triangle_array")
+            if cached is not None:
+                total += cached[1].nbytes
+        return total
+
+
+def dict_nbytes(strokes):
+    """
+    Memory a load_shapes-style list of stroke dicts of tuples takes (the old per-entity
+    cost), counted from the Python objects it is made of.
+    """
+    float_size = sys.getsizeof(0.0)
+    total = sys.getsizeof([None] * len(strokes))
+    for stroke in strokes:
+        fields = {}
+        for key, value in stroke.items():
+            if key in ("points", "fixed_points"):
+                fields[key] = [(0.0, 0.0)] * len(value)
+                total += sys.getsizeof(fields[key]) + len(value) * (sys.getsizeof((0.0, 0.0)) + 2 * float_size)
+            elif key in ("line_color", "fill_color") and value is not None:
+                fields[key] = tuple(value)
+                total += sys.getsizeof(fields[key]) + len(value) * float_size
+            else:
+                fields[key] = value
+        total += sys.getsizeof(fields)
+    return total
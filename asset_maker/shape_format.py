@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import numpy as np
+
+if __package__ in (None, ""):
+    # Running the converter directly as asset_maker/shape_format.py: make the project importable.
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from asset_maker.geometry import fill_indices, stroke_cache
+
+# -------------------------------------------------
+# Binary shape files (.shpb, no GL calls in here)
+# -------------------------------------------------
+# A .shpb file sits next to the .json it was converted from: a header, one fixed
+# size record per stroke, then every stroke's points as packed float32 (x, y)
+# pairs and its fill triangles as uint32 indices. Files are opened with mmap and
+# the arrays handed out as read-only numpy views, so loading boxes no floats and
+# triangulates nothing.
+#
+# A .shpb file is used while the JSON's size and mtime match its header; if they
+# do not (checkout, touch) the JSON's SHA-1 decides, and a changed JSON is loaded
+# as before until the converter is run again.
+#
+# A stroke read back has exactly the keys its JSON had ("key in stroke" decides
+# e.g. whether bounds come from the points or the fixed points), so every optional
+# key has a flag saying whether it was there.
+SHAPE_MAGIC = b"SHPB"
+SHAPE_VERSION = 2
+# magic, version, stroke count, source size, source mtime (ns), source SHA-1
+SHAPE_HEADER = struct.Struct("<4sIIQq20s")
+# type, flags, point count, fixed point count, index count, line colour, fill colour
+SHAPE_STROKE = struct.Struct("<16sIIII3d3d")
+SHAPE_ALIGN = 16
+
+FLAG_FILLED = 1
+FLAG_FILL_COLOR = 2
+FLAG_FIXED_POINTS = 4
+FLAG_FINALIZED_KEY = 8
+FLAG_FINALIZED = 16
+FLAG_POINTS_KEY = 32
+FLAG_FILLED_KEY = 64
+FLAG_FILL_COLOR_KEY = 128
+
+# keys a stroke may have to be stored in binary; anything else stays JSON only
+STROKE_KEYS = {"type", "points", "line_color", "filled", "fill_color", "fixed_points", "finalized"}
+
+
+def binary_path(filename):
+    """The .shpb file that goes with a shape JSON file."""
+    return os.path.splitext(filename)[0] + ".shpb"
+
+
+def _source_hash(filename):
+    with open(filename, "rb") as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def _aligned(offset):
+    return -(-offset // SHAPE_ALIGN) * SHAPE_ALIGN
+
+
+def read_binary(filename):
+    """
+    Loads the strokes of a shape JSON file from its .shpb file. Points and fixed
+    points are read-only (n, 2) float32 views of the mapped file and the fill
+    triangles are already in the stroke cache. Returns None if the binary file is
+    missing, corrupt or older than the JSON.
+    """
+    path = binary_path(filename)
+    try:
+        stat = os.stat(filename)
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, version, count, size, mtime, digest = SHAPE_HEADER.unpack_from(data, 0)
+        if magic != SHAPE_MAGIC or version != SHAPE_VERSION:
+            return None
+        if (size, mtime) != (stat.st_size, stat.st_mtime_ns) and digest != _source_hash(filename):
+            return None
+        records = [SHAPE_STROKE.unpack_from(data, SHAPE_HEADER.size + i * SHAPE_STROKE.size)
+                   for i in range(count)]
+        offset = _aligned(SHAPE_HEADER.size + count * SHAPE_STROKE.size)
+
+        def take(dtype, n, width):
+            nonlocal offset
+            nbytes = n * width * np.dtype(dtype).itemsize
+            if offset + nbytes > len(data):
+                raise ValueError("truncated shape file")
+            array = np.frombuffer(data, dtype=dtype, count=n * width, offset=offset)
+            offset = _aligned(offset + nbytes)
+            return array.reshape(n, width) if width > 1 else array
+
+        strokes = []
+        for kind, flags, n_points, n_fixed, n_indices, *colors in records:
+            stroke = {"type": kind.rstrip(b"\0").decode("utf-8")}
+            if flags & FLAG_POINTS_KEY:
+                stroke["points"] = take(np.float32, n_points, 2)
+            stroke["line_color"] = tuple(colors[:3])
+            if flags & FLAG_FILLED_KEY:
+                stroke["filled"] = bool(flags & FLAG_FILLED)
+            if flags & FLAG_FILL_COLOR_KEY:
+                stroke["fill_color"] = tuple(colors[3:]) if flags & FLAG_FILL_COLOR else None
+            if flags & FLAG_FIXED_POINTS:
+                stroke["fixed_points"] = take(np.float32, n_fixed, 2)
+            if flags & FLAG_FINALIZED_KEY:
+                stroke["finalized"] = bool(flags & FLAG_FINALIZED)
+            if n_indices:
+                indices = take(np.uint32, n_indices, 1)
+                cache = stroke_cache(stroke)
+                cache["triangles"] = (stroke["points"], n_points, indices)
+                cache["triangle_array"] = (indices, indices)
+            strokes.append(stroke)
+        return strokes
+    except (struct.error, ValueError, UnicodeDecodeError):
+        return None
+
+
+def _pack_points(pts):
+    return np.asarray(pts, dtype=np.float32).reshape(-1, 2)
+
+
+def write_binary(filename):
+    """
+    Converts a shape JSON file to its .shpb file (atomically). Raises ValueError
+    for strokes the binary format cannot hold.
+    """
+    with open(filename, "r") as f:
+        shapes = json.load(f)
+    stat = os.stat(filename)
+    header = SHAPE_HEADER.pack(SHAPE_MAGIC, SHAPE_VERSION, len(shapes), stat.st_size,
+                               stat.st_mtime_ns, _source_hash(filename))
+    records = []
+    arrays = []
+    for shape in shapes:
+        extra = set(shape) - STROKE_KEYS
+        if extra:
+            raise ValueError(f"stroke keys {sorted(extra)} are not supported")
+        kind = shape["type"].encode("utf-8")
+        if len(kind) > 16:
+            raise ValueError(f"stroke type '{shape['type']}' is too long")
+        fill_color = shape.get("fill_color")
+        flags = 0
+        if "filled" in shape:
+            flags |= FLAG_FILLED_KEY | (FLAG_FILLED if shape["filled"] else 0)
+        if "fill_color" in shape:
+            flags |= FLAG_FILL_COLOR_KEY | (FLAG_FILL_COLOR if fill_color is not None else 0)
+        points = _pack_points(shape.get("points", []))
+        if "points" in shape:
+            flags |= FLAG_POINTS_KEY
+            arrays.append(points)
+        n_fixed = 0
+        if "fixed_points" in shape:
+            flags |= FLAG_FIXED_POINTS
+            fixed = _pack_points(shape["fixed_points"])
+            n_fixed = len(fixed)
+            arrays.append(fixed)
+        if "finalized" in shape:
+            flags |= FLAG_FINALIZED_KEY | (FLAG_FINALIZED if shape["finalized"] else 0)
+        indices = np.zeros(0, dtype=np.uint32)
+        if shape.get("filled", False) and "points" in shape:
+            # triangulated from the JSON's own (double precision) points, as load_shapes would
+            indices = np.array(fill_indices({"points": [tuple(pt) for pt in shape["points"]]}),
+                               dtype=np.uint32)
+            if len(indices):
+                arrays.append(indices)
+        records.append(SHAPE_STROKE.pack(kind, flags, len(points), n_fixed, len(indices),
+                                         *shape["line_color"], *(fill_color or (0.0, 0.0, 0.0))))
+
+    path = binary_path(filename)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(header)
+        f.write(b"".join(records))
+        for array in arrays:
+            f.write(b"\0" * (_aligned(f.tell()) - f.tell()))
+            f.write(np.ascontiguousarray(array).data)
+    os.replace(tmp, path)
+    return path
+
+
+def convert_tree(root="assets"):
+    """Converts every shape JSON file under root to .shpb. Returns (converted, skipped)."""
+    converted, skipped = [], []
+    for folder, _, files in os.walk(root):
+        for name in sorted(files):
+            if not name.endswith(".json"):
+                continue
+            filename = os.path.join(folder, name)
+            try:
+                write_binary(filename)
+                converted.append(filename)
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"Skipped '{filename}': {e}")
+                skipped.append(filename)
+    return converted, skipped
+
+
+if __name__ == "__main__":
+    # python asset_maker/shape_format.py [folder ...]   (default: assets)
+    for root in sys.argv[1:] or ["assets"]:
+        converted, skipped = convert_tree(root)
+        print(f"{root}: converted {len(converted)} shape file(s), skipped {len(skipped)}.")
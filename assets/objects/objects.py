@@ -1,13 +1,16 @@
 import sys
 import math
 import random
+from operator import attrgetter
 import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
 
-from utils.graphics import draw_filled_circle
-from asset_maker.maker import draw_shadow_at, load_shapes, draw_stroke,draw_at
+from utils.graphics import draw_filled_circle, flush_batches
+from asset_maker.maker import draw_shadow_at, draw_stroke,draw_at
+from utils.assets import shape_assets
+from assets.objects.platform_field import PlatformField
 
 # -------------------------------------------------
 # Constants & Setup
@@ -29,29 +32,61 @@ ROW_Y = [WINDOW_HEIGHT/3, WINDOW_HEIGHT/2, (2*WINDOW_HEIGHT)/3]
 # -------------------------------------------------
 # Platform Class
 # -------------------------------------------------
+def _field_value(name):
+    """A Platform attribute stored in its PlatformField's `name` column."""
+    column = attrgetter(name)
+
+    def get(self):
+        field = self.field
+        if field.vectorized:
+            return column(field).item(self.index)
+        return column(field)[self.index]
+
+    def set(self, value):
+        field = self.field
+        column(field)[self.index] = value
+        field.version += 1  # moved outside a step: re-index before the next query
+    return property(get, set)
+
+
 class Platform:
-    def __init__(self, gridRow, gridCol, leftBound, rightBound, speed,coins=1,shape=load_shapes("assets\shapes\wood.json") or None,shape_x=-116,shape_y=-73,shape_size=0.3,coin_shape=load_shapes("assets\shapes\coin.json") or None,issquid=False):
+    """
+    A platform's position, velocity, bounds and radius are a view onto a slot of a
+    PlatformField, so the games can step all of them at once. A new platform has a
+    field of its own until it is appended to the level's field.
+    """
+    x = _field_value("x")
+    y = _field_value("y")
+    vx = _field_value("vx")
+    leftBoundX = _field_value("left")
+    rightBoundX = _field_value("right")
+    radius = _field_value("radius")
+
+    def __init__(self, gridRow, gridCol, leftBound, rightBound, speed,coins=1,shape=None,shape_x=-116,shape_y=-73,shape_size=0.3,coin_shape=None,issquid=False):
         self.row = gridRow
         self.col = gridCol
-        self.radius = 26
         self.leftBound=leftBound
         self.rightBound=rightBound
         self.speed = speed
-        # Compute initial x position from grid
-        self.x = RIVER_START_X + (gridCol - 0.5) * CELL_WIDTH
-        self.y = ROW_Y[gridRow - 1]
-        # Compute actual horizontal bounds
-        self.leftBoundX = RIVER_START_X + (leftBound - 0.5) * CELL_WIDTH
-        self.rightBoundX = RIVER_START_X + (rightBound - 0.5) * CELL_WIDTH
-        # Random initial direction
-        self.vx = self.speed if random.random() < 0.5 else -self.speed
+        PlatformField().add(
+            self,
+            # Compute initial x position from grid
+            RIVER_START_X + (gridCol - 0.5) * CELL_WIDTH,
+            ROW_Y[gridRow - 1],
+            # Random initial direction
+            self.speed if random.random() < 0.5 else -self.speed,
+            # Compute actual horizontal bounds
+            RIVER_START_X + (leftBound - 0.5) * CELL_WIDTH,
+            RIVER_START_X + (rightBound - 0.5) * CELL_WIDTH,
+            26,
+        )
         self.coins = coins
 
-        self.shape=shape
+        self.shape=shape if shape is not None else shape_assets.get("assets/shapes/wood.json") or None
         self.shape_x=shape_x
         self.shape_y=shape_y
         self.shape_size=shape_size
-        self.coin_shape=coin_shape
+        self.coin_shape=coin_shape if coin_shape is not None else shape_assets.get("assets/shapes/coin.json") or None
 
         self.issquid=issquid
 
@@ -62,6 +97,7 @@ class Platform:
     
 
     def update(self, dt):
+        """Steps this platform alone; the games step their whole PlatformField instead."""
         self.x += self.vx * dt
         if self.x - self.radius < self.leftBoundX:
             self.x = self.leftBoundX + self.radius
@@ -70,22 +106,24 @@ class Platform:
             self.x = self.rightBoundX - self.radius
             self.vx = -abs(self.vx)
 
-    def draw(self):
+    def draw(self, batch=None):
+        """Draws the platform, or queues it on an InstanceBatch if one is given."""
+        shape_at, shadow_at = (batch.draw_at, batch.draw_shadow_at) if batch else (draw_at, draw_shadow_at)
         # glColor3f(0.0, 1.0, 0.0)
         # light brown
         # glColor3f(0.8, 0.6, 0.2)
         # draw_filled_circle(self.x, self.y, self.radius)
         if(self.shape!=None):
             if(not self.issquid):
-                draw_shadow_at(self.shape, self.x+self.shape_x, self.y+self.shape_y+10,self.shape_size)
-            draw_at(self.shape, self.x+self.shape_x, self.y+self.shape_y,self.shape_size)
+                shadow_at(self.shape, self.x+self.shape_x, self.y+self.shape_y+10,self.shape_size)
+            shape_at(self.shape, self.x+self.shape_x, self.y+self.shape_y,self.shape_size)
             
         else:
             glColor3f(0.8, 0.6, 0.2)
             draw_filled_circle(self.x, self.y, self.radius)
         
         if(self.coins>0 and self.shape!=None):
-            draw_at(self.coin_shape, self.x-110,self.y-75,0.25)
+            shape_at(self.coin_shape, self.x-110,self.y-75,0.25)
 
 
 
@@ -97,7 +135,7 @@ class Crocodile:
     Moves up and down, jumps over platforms, and has a shadow effect.
     """
     def __init__(self, x=WINDOW_WIDTH/2, y=0, speed=100.0,
-                 jumpDuration=1, jumpHeight=20.0, radius=20,shape=load_shapes("assets\objects\crocodile_shape.json"),
+                 jumpDuration=1, jumpHeight=20.0, radius=20,shape=None,
                  jump_detection_range=70, animDuration=0.25,
                  inSpace=False,
                  inSquid=False,
@@ -108,11 +146,11 @@ class Crocodile:
         self.vx = 0
         self.vy = speed
         self.radius = radius
-        self.shape = shape
+        self.shape = shape if shape is not None else shape_assets.get("assets/objects/crocodile_shape.json")
 
         # space shapes
-        self.ufo1 = load_shapes("assets/shapes/ufo1.json")
-        self.ufo2 = load_shapes("assets/shapes/ufo2.json")
+        self.ufo1 = shape_assets.get("assets/shapes/ufo1.json")
+        self.ufo2 = shape_assets.get("assets/shapes/ufo2.json")
 
 
 
@@ -145,7 +183,7 @@ class Crocodile:
         # squid 
         self.inSquid=inSquid
         if(self.inSquid):
-            self.shape=load_shapes("assets/shapes/bird.json")
+            self.shape=shape_assets.get("assets/shapes/bird.json")
     
         
     def hover_offset(self):
@@ -206,7 +244,11 @@ class Crocodile:
         # Check for platforms to jump EARLY
         # ---------------------------
         if not self.isJumping:
-            for platform in platforms:
+            # only platforms spanning this x on a lane within look-ahead range can trigger a jump
+            ahead = self.jump_detection_range
+            nearby = platforms.column(self.x, self.y - self.speed * dt - ahead,
+                                      self.y + abs(self.vy) * dt + ahead)
+            for platform in nearby:
                 # Check if crocodile's x is near the platform's x
                 if (platform.x - platform.radius) <= self.x <= (platform.x + platform.radius):
                     # Look ahead by 'jump_detection_range' to anticipate a jump
@@ -240,10 +282,12 @@ class Crocodile:
             self.vy=self.speed
             self.flipy= not self.flipy
     
-    def draw(self):
+    def draw(self, batch=None):
         """
         Draw the crocodile with a shadow and a parabolic jump effect.
+        With an InstanceBatch the draws are queued on it instead.
         """
+        shape_at, shadow_at = (batch.draw_at, batch.draw_shadow_at) if batch else (draw_at, draw_shadow_at)
         # Calculate jump offset
         jumpOffset = self.get_jump_offset()
         spaceOffset = self.hover_offset()
@@ -257,27 +301,27 @@ class Crocodile:
             # draw_shadow_at(self.ufo1, self.x-130-spaceOffset, self.y-100,0.4)
             # draw_at(self.ufo1, self.x-130-spaceOffset, self.y-jumpOffset-100,0.4)
             if(self.lightbulb==False):
-                draw_shadow_at(self.ufo1, self.x-130-spaceOffset, self.y-100,0.4)
-                draw_at(self.ufo1, self.x-130-spaceOffset, self.y-jumpOffset-100,0.4)
+                shadow_at(self.ufo1, self.x-130-spaceOffset, self.y-100,0.4)
+                shape_at(self.ufo1, self.x-130-spaceOffset, self.y-jumpOffset-100,0.4)
                 # print("ufo1")
             else:
-                draw_shadow_at(self.ufo2, self.x-130-spaceOffset, self.y-100,0.4,0.4)
-                draw_at(self.ufo2, self.x-130-spaceOffset, self.y-jumpOffset-100,0.4,0.4)
+                shadow_at(self.ufo2, self.x-130-spaceOffset, self.y-100,0.4,0.4)
+                shape_at(self.ufo2, self.x-130-spaceOffset, self.y-jumpOffset-100,0.4,0.4)
                 # print("ufo2")
             return 
 
         if(self.inSquid==True):
             if(self.flipy==True):
               
-                draw_shadow_at(self.shape, self.x-130-spaceOffset, self.y-100,0.3,color=(0.0, 0.0, 0.0, 0.1))
-                draw_at(self.shape, self.x-130-spaceOffset, self.y-jumpOffset-90,0.3)
+                shadow_at(self.shape, self.x-130-spaceOffset, self.y-100,0.3,color=(0.0, 0.0, 0.0, 0.1))
+                shape_at(self.shape, self.x-130-spaceOffset, self.y-jumpOffset-90,0.3)
                 
             
 
             else:
             
-                draw_shadow_at(self.shape, self.x-130-spaceOffset, self.y+110,0.3,-0.3,color=(0.0, 0.0, 0.0, 0.1))
-                draw_at(self.shape, self.x-130-spaceOffset, self.y-jumpOffset+90,0.3,-0.3)
+                shadow_at(self.shape, self.x-130-spaceOffset, self.y+110,0.3,-0.3,color=(0.0, 0.0, 0.0, 0.1))
+                shape_at(self.shape, self.x-130-spaceOffset, self.y-jumpOffset+90,0.3,-0.3)
             
                 
             return
@@ -286,21 +330,21 @@ class Crocodile:
         if(self.flipy==True):
             if(self.flipx==False):
              
-                draw_shadow_at(self.shape, self.x-130-spaceOffset, self.y-100,0.4)
-                draw_at(self.shape, self.x-130-spaceOffset, self.y-jumpOffset-100,0.4)
+                shadow_at(self.shape, self.x-130-spaceOffset, self.y-100,0.4)
+                shape_at(self.shape, self.x-130-spaceOffset, self.y-jumpOffset-100,0.4)
             else:
             
-                draw_shadow_at(self.shape, self.x+145-spaceOffset, self.y-100,-0.4,0.4)
-                draw_at(self.shape, self.x+145-spaceOffset, self.y-jumpOffset-100,-0.4,0.4)
+                shadow_at(self.shape, self.x+145-spaceOffset, self.y-100,-0.4,0.4)
+                shape_at(self.shape, self.x+145-spaceOffset, self.y-jumpOffset-100,-0.4,0.4)
 
         else:
             if(self.flipx==False):
-                draw_shadow_at(self.shape, self.x-130-spaceOffset, self.y+100,0.4,-0.4)
-                draw_at(self.shape, self.x-130-spaceOffset, self.y-jumpOffset+100,0.4,-0.4)
+                shadow_at(self.shape, self.x-130-spaceOffset, self.y+100,0.4,-0.4)
+                shape_at(self.shape, self.x-130-spaceOffset, self.y-jumpOffset+100,0.4,-0.4)
             
             else:
-                draw_shadow_at(self.shape, self.x+145-spaceOffset, self.y+100,-0.4,-0.4)
-                draw_at(self.shape, self.x+145-spaceOffset, self.y-jumpOffset+100,-0.4,-0.4)
+                shadow_at(self.shape, self.x+145-spaceOffset, self.y+100,-0.4,-0.4)
+                shape_at(self.shape, self.x+145-spaceOffset, self.y-jumpOffset+100,-0.4,-0.4)
 
         # draw_filled_circle(self.x, self.y, self.radius)  # Slightly bigger shadow
 
@@ -314,7 +358,7 @@ class Crocodile:
         
 class Doll:
     # on the right bank of the river
-    def __init__(self, x=WINDOW_WIDTH-RIGHT_BANK_WIDTH/2, y=WINDOW_HEIGHT/2, speed=100,time_to_turn=2,radius=20,shapes=[load_shapes("assets\shapes\doll_green.json"),load_shapes("assets\shapes\doll_red.json")]):
+    def __init__(self, x=WINDOW_WIDTH-RIGHT_BANK_WIDTH/2, y=WINDOW_HEIGHT/2, speed=100,time_to_turn=2,radius=20,shapes=None):
         self.x = x
         self.y = y
      
@@ -328,6 +372,8 @@ class Doll:
         self.shoot_duration = 0.3
         self.shoot_time = 0.0
         self.shooting_animation = False
+        if shapes is None:
+            shapes=[shape_assets.get("assets/shapes/doll_green.json"),shape_assets.get("assets/shapes/doll_red.json")]
         self.shapes=shapes
         self.shape = self.shapes[0]
     
@@ -393,6 +439,7 @@ class Doll:
 
         # draw a line from the doll to the player
         if(self.is_shooting):
+            flush_batches()
             glColor3f(1.0, 0.0, 0.0)
             glLineWidth(5)
             glBegin(GL_LINES)
@@ -418,19 +465,19 @@ class Doll:
 class Player:
     def __init__(self, x=LEFT_BANK_WIDTH/2
                  , y=WINDOW_HEIGHT/2,radious=12
-                 ,speed=200.0,shape=load_shapes("assets\objects\player_shape.json"),
+                 ,speed=200.0,shape=None,
                  jumpDuration=0.5, jumpHeight=40.0, angularSpeed=2.0,health=100,lives=3,
                  hover_fuel=100,hover_height=100,inspace=False
                  ):
         self.default_x=x
         self.default_y=y
         self.default_speed=speed
-        self.player_shape = shape
+        self.player_shape = shape if shape is not None else shape_assets.get("assets/objects/player_shape.json")
 
         # space shapes
 
-        self.space_man=load_shapes("assets/shapes/space_man.json")
-        self.space_man_rocket=load_shapes("assets/shapes/space_man_rocket.json")
+        self.space_man=shape_assets.get("assets/shapes/space_man.json")
+        self.space_man_rocket=shape_assets.get("assets/shapes/space_man_rocket.json")
         if(inspace):
             self.player_shape=self.space_man
 
@@ -547,17 +594,16 @@ class Player:
 
     def try_attach(self, platforms):
         self.attachedPlatform = None
-        for p in platforms:
-            dist = math.hypot(self.x - p.x, self.y - p.y)
-            if dist < (p.radius + self.radius):
-                self.attachedPlatform = p
-
-                # take coin from platform if there
-                if p.coins > 0:
-                    self.coins += p.coins
-                    p.coins = 0
-                    print('COINS COLLECTED')
-                break
+        # the first platform (in level order) the player's circle overlaps
+        for p in platforms.under(self.x, self.y, self.radius):
+            self.attachedPlatform = p
+
+            # take coin from platform if there
+            if p.coins > 0:
+                self.coins += p.coins
+                p.coins = 0
+                print('COINS COLLECTED')
+            break
 
     def get_jump_offset(self):
         if not self.isJumping:
@@ -620,7 +666,7 @@ class Player:
     
     def space_update(self, dt, keys, platforms):
         acceleration = 800  # How fast the object accelerates
-        friction = 0.85  # How much it slows down when no keys are pressed
+        friction = 0.85  # Speed kept per 1/FPS of a second when no keys are pressed
         max_speed = 400  # Maximum movement speed
 
         # Apply acceleration based on key inputs
@@ -633,9 +679,10 @@ class Player:
         if keys[K_DOWN] or keys[K_s]:
             self.vy += acceleration * dt
 
-        # Apply friction when no input is given
-        self.vx *= friction
-        self.vy *= friction
+        # Apply friction, scaled to the step so it is the same per second at any dt
+        damping = friction ** (dt * FPS)
+        self.vx *= damping
+        self.vy *= damping
 
         # Limit speed
         self.vx = max(-max_speed, min(max_speed, self.vx))
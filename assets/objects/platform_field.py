@@ -0,0 +1,325 @@
+import math
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+
+from utils.spatial_hash import SpatialHash
+
+# -------------------------------------------------
+# Platform physics as arrays (no GL calls in here)
+# -------------------------------------------------
+# Every platform's position, velocity, bounds and radius live in one set of columns;
+# Platform objects are views onto a slot. Small fields (every shipped level) keep
+# the columns as lists and step them with the games' original Python loops: with a
+# handful of platforms numpy's per-call overhead costs more than it saves. Past
+# VECTOR_COUNT platforms the columns become numpy arrays: a step moves and reflects
+# all platforms at once and pushes overlapping pairs apart, testing every pair
+# (or, past HASH_COUNT, a spatial hash's neighbours). The player's and the
+# crocodiles' "which platform is here" queries then go through a lane index:
+# platforms sit on the ROW_Y lanes and only move along them, so each lane is a
+# list sorted by x and a lookup is two bisects.
+#
+# A vectorized step costs about as much as the candidate pairs it tests. Spread
+# out, that is a few per platform (1000 platforms ~0.6 ms, 5000 ~3 ms); packed
+# onto the three lanes, every platform overlaps dozens of others and the pair
+# count grows with n^2 (1000 ~4-8 ms, 3000 ~40 ms, 5000 ~150-230 ms).
+COLLISION_PADDING = 0.5    # small extra distance to prevent sticking
+CORRECTION_FACTOR = 0.25   # share of the overlap each platform of a pair moves per step
+
+FIELDS = ("x", "y", "vx", "left", "right", "radius")
+# Fields with more platforms than this switch to numpy arrays (and stay that way).
+VECTOR_COUNT = 12
+# Vectorized fields up to this size test every pair at once; the spatial hash only
+# pays for its rebuild on bigger ones.
+HASH_COUNT = 80
+# Up to this many platforms the lane index is sorted in plain Python.
+SMALL_LANES = 64
+# Spatial hash cells; grown if a platform is wider (overlapping pairs must be neighbours).
+CELL_SIZE = 64.0
+
+
+class LaneIndex:
+    """
+    Circles grouped into lanes of equal y, each lane sorted by x. Built for items
+    that share a few y values (the platform rows); any y works, it just makes more
+    lanes. Queries return item indices in ascending order.
+    """
+
+    def __init__(self):
+        self.rebuild(np.zeros(0), np.zeros(0), np.zeros(0))
+
+    def rebuild(self, x, y, radius):
+        """Re-sorts every circle into its lane; call after the centres have moved."""
+        n = len(x)
+        self.xs, self.ys, self.radii = x.tolist(), y.tolist(), radius.tolist()
+        self.max_radius = max(self.radii) if n else 0.0
+        if n <= SMALL_LANES:
+            order = sorted(range(n), key=lambda i: (self.ys[i], self.xs[i]))
+            sorted_x = [self.xs[i] for i in order]
+            starts = [rank for rank in range(n) if rank == 0 or self.ys[order[rank]] != self.ys[order[rank - 1]]]
+        else:
+            order = np.lexsort((x, y))
+            sorted_x, sorted_y = x[order].tolist(), y[order]
+            starts = np.flatnonzero(np.append(True, sorted_y[1:] != sorted_y[:-1])).tolist()
+            order = order.tolist()
+        ends = starts[1:] + [n]
+        self.lane_ys = [self.ys[order[start]] for start in starts]
+        self.lane_items = [order[start:end] for start, end in zip(starts, ends)]
+        self.lane_xs = [sorted_x[start:end] for start, end in zip(starts, ends)]
+
+    def _near(self, x, y0, y1, reach):
+        """Items in the lanes between y0 and y1 whose centre is within reach of x."""
+        found = []
+        for lane in range(bisect_left(self.lane_ys, y0), bisect_right(self.lane_ys, y1)):
+            xs = self.lane_xs[lane]
+            found.extend(self.lane_items[lane][bisect_left(xs, x - reach):bisect_right(xs, x + reach)])
+        return found
+
+    def under(self, x, y, r=0.0):
+        """Items whose circle comes closer than r to (x, y)."""
+        reach = r + self.max_radius
+        xs, ys, radii = self.xs, self.ys, self.radii
+        hits = []
+        for i in self._near(x, y - reach, y + reach, reach):
+            limit = radii[i] + r
+            dx, dy = xs[i] - x, ys[i] - y
+            if dx * dx + dy * dy < limit * limit:
+                hits.append(i)
+        hits.sort()
+        return hits
+
+    def column(self, x, y0, y1):
+        """Items centred between y0 and y1 whose circle spans x."""
+        xs, radii = self.xs, self.radii
+        hits = [i for i in self._near(x, y0, y1, self.max_radius) if abs(xs[i] - x) <= radii[i]]
+        hits.sort()
+        return hits
+
+
+class PlatformField:
+    """
+    Struct-of-arrays store for platforms. It behaves like the list of Platforms the
+    games kept before (append, len, iteration, indexing); move(dt) and
+    resolve_overlaps() step them all.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.platforms = []
+        self.vectorized = False
+        self.version = 0    # bumped whenever a platform is added or moved
+        self.grid = SpatialHash(CELL_SIZE)
+        self.grid_version = -1
+        self.all_pairs = None   # (i, j) of every pair, while the field is below HASH_COUNT
+        self.lanes = LaneIndex()
+        self.lanes_version = -1
+        for name in FIELDS:
+            setattr(self, name, [])
+
+    def _vectorize(self):
+        """Moves the columns into numpy arrays, with room to grow."""
+        for name in FIELDS:
+            array = np.zeros(2 * self.count, dtype=np.float64)
+            array[:self.count] = getattr(self, name)
+            setattr(self, name, array)
+        self.vectorized = True
+
+    def _grow(self):
+        capacity = 2 * len(self.x)
+        for name in FIELDS:
+            array = np.zeros(capacity, dtype=np.float64)
+            array[:self.count] = getattr(self, name)[:self.count]
+            setattr(self, name, array)
+
+    def add(self, platform, x, y, vx, left, right, radius):
+        """Gives platform a new slot holding these values and makes it a view onto it."""
+        index = self.count
+        values = (x, y, vx, left, right, radius)
+        if not self.vectorized and index == VECTOR_COUNT:
+            self._vectorize()
+        if self.vectorized:
+            if index == len(self.x):
+                self._grow()
+            for name, value in zip(FIELDS, values):
+                getattr(self, name)[index] = value
+        else:
+            for name, value in zip(FIELDS, values):
+                getattr(self, name).append(value)
+        self.count += 1
+        self.version += 1
+        self.platforms.append(platform)
+        platform.field = self
+        platform.index = index
+        return index
+
+    def append(self, platform):
+        """Moves a platform (and its current state) over from the field it was in."""
+        old, i = platform.field, platform.index
+        self.add(platform, *(getattr(old, name)[i] for name in FIELDS))
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        return iter(self.platforms)
+
+    def __getitem__(self, index):
+        return self.platforms[index]
+
+    # -------------------------------------------------
+    # Stepping
+    # -------------------------------------------------
+    def move(self, dt):
+        """Platform.update for every platform: move, and turn round at the bounds."""
+        self.version += 1
+        n = self.count
+        if not self.vectorized:
+            x, vx, radius, left, right = self.x, self.vx, self.radius, self.left, self.right
+            for i in range(n):
+                xi = x[i] + vx[i] * dt
+                if xi - radius[i] < left[i]:
+                    xi = left[i] + radius[i]
+                    vx[i] = abs(vx[i])
+                if xi + radius[i] > right[i]:
+                    xi = right[i] - radius[i]
+                    vx[i] = -abs(vx[i])
+                x[i] = xi
+            return
+        x, vx, radius = self.x[:n], self.vx[:n], self.radius[:n]
+        left, right = self.left[:n], self.right[:n]
+        x += vx * dt
+        low = x - radius < left
+        if low.any():  # most steps nobody reaches a bound
+            x[low] = left[low] + radius[low]
+            vx[low] = np.abs(vx[low])
+        high = x + radius > right
+        if high.any():
+            x[high] = right[high] - radius[high]
+            vx[high] = -np.abs(vx[high])
+
+    def rebuild_grid(self):
+        """Re-bins every platform in the spatial hash at its current position."""
+        n = self.count
+        reach = 2.0 * float(self.radius[:n].max()) + COLLISION_PADDING if n else 0.0
+        if reach > self.grid.cell_size:
+            self.grid = SpatialHash(reach)
+        self.grid.rebuild(self.x[:n], self.y[:n])
+        self.grid_version = self.version
+
+    def spatial_hash(self):
+        """The hash of the current positions (rebuilt if platforms were added or moved)."""
+        if self.grid_version != self.version:
+            self.rebuild_grid()
+        return self.grid
+
+    def resolve_overlaps(self, padding=COLLISION_PADDING, correction=CORRECTION_FACTOR):
+        """
+        Overlapping platforms moving in opposite directions both reverse, and every
+        overlapping pair is pushed apart by a share of the overlap. Small fields take
+        the pairs one after another, as the games did, each seeing the pushes before
+        it. Vectorized fields resolve all pairs from the positions at the start of the
+        call, so a platform caught between two others gets both pushes (and reverses
+        once per opposing pair); that only differs when three or more overlap at once.
+        The work grows with the number of overlapping pairs, not just the platform
+        count (see the header). Returns whether any platform was pushed.
+        """
+        n = self.count
+        if n < 2:
+            return False
+        if self.vectorized:
+            pushed = self._resolve_vectorized(padding, correction)
+        else:
+            pushed = self._resolve_pairwise(padding, correction)
+        if pushed:
+            self.version += 1
+        return pushed
+
+    def _resolve_pairwise(self, padding, correction):
+        x, y, vx, radius = self.x, self.y, self.vx, self.radius
+        n = self.count
+        pushed = False
+        for i in range(n):
+            for j in range(i + 1, n):
+                dx = x[i] - x[j]
+                dy = y[i] - y[j]
+                distance = math.hypot(dx, dy)
+                min_distance = radius[i] + radius[j] + padding
+                if distance < min_distance:
+                    # reverse only if they are moving towards one another
+                    if (vx[i] > 0 and vx[j] < 0) or (vx[i] < 0 and vx[j] > 0):
+                        vx[i] = -vx[i]
+                        vx[j] = -vx[j]
+                    if distance == 0:
+                        distance = 0.1  # no direction to push in
+                    overlap = min_distance - distance
+                    nx = dx / distance
+                    ny = dy / distance
+                    x[i] += nx * overlap * correction
+                    y[i] += ny * overlap * correction
+                    x[j] -= nx * overlap * correction
+                    y[j] -= ny * overlap * correction
+                    pushed = True
+        return pushed
+
+    def candidate_pairs(self):
+        """Index arrays (i, j) of the pairs that may overlap: all of them, or the hash's neighbours."""
+        n = self.count
+        if n > HASH_COUNT:
+            return self.spatial_hash().candidate_pairs()
+        if self.all_pairs is None or len(self.all_pairs[0]) != n * (n - 1) // 2:
+            self.all_pairs = np.triu_indices(n, 1)
+        return self.all_pairs
+
+    def _resolve_vectorized(self, padding, correction):
+        n = self.count
+        i, j = self.candidate_pairs()
+        if not len(i):
+            return False
+        x, y, vx, radius = self.x[:n], self.y[:n], self.vx[:n], self.radius[:n]
+        dx = x[i] - x[j]
+        dy = y[i] - y[j]
+        distance = np.hypot(dx, dy)
+        min_distance = radius[i] + radius[j] + padding
+        hit = distance < min_distance
+        if not hit.any():
+            return False
+        i, j, dx, dy = i[hit], j[hit], dx[hit], dy[hit]
+        distance, min_distance = distance[hit], min_distance[hit]
+
+        opposing = vx[i] * vx[j] < 0.0
+        flips = np.bincount(np.concatenate((i[opposing], j[opposing])), minlength=n) % 2 == 1
+        vx[flips] = -vx[flips]
+
+        distance = np.where(distance == 0.0, 0.1, distance)  # no direction to push in
+        push = (min_distance - distance) / distance * correction
+        px, py = dx * push, dy * push
+        x += np.bincount(i, px, n) - np.bincount(j, px, n)
+        y += np.bincount(i, py, n) - np.bincount(j, py, n)
+        return True
+
+    # -------------------------------------------------
+    # Lane queries
+    # -------------------------------------------------
+    def lane_index(self):
+        """The lanes of the current positions (rebuilt if platforms were added or moved)."""
+        if self.lanes_version != self.version:
+            n = self.count
+            self.lanes.rebuild(self.x[:n], self.y[:n], self.radius[:n])
+            self.lanes_version = self.version
+        return self.lanes
+
+    def under(self, x, y, r=0.0):
+        """Platforms whose circle overlaps the circle (x, y, r), in field order (an iterable)."""
+        platforms = self.platforms
+        if not self.vectorized:
+            return (p for p, px, py, pr in zip(platforms, self.x, self.y, self.radius)
+                    if math.hypot(x - px, y - py) < pr + r)
+        return [platforms[i] for i in self.lane_index().under(x, y, r)]
+
+    def column(self, x, y0, y1):
+        """Platforms spanning x on the lanes between y0 and y1, in field order (an iterable)."""
+        platforms = self.platforms
+        if not self.vectorized:
+            return (p for p, px, py, pr in zip(platforms, self.x, self.y, self.radius)
+                    if px - pr <= x <= px + pr and y0 <= py <= y1)
+        return [platforms[i] for i in self.lane_index().column(x, y0, y1)]
@@ -30,4 +30,50 @@ object_shader = {
 
         '''
 
-}
\ No newline at end of file
+}
+
+# GLSL 1.20 so they run in the compatibility context pygame creates; the quad is
+# drawn with the fixed-function matrices, colour and texture coordinates.
+surface_vertex_shader = '''
+        #version 120
+
+        varying vec2 uv;
+        varying vec4 tint;
+
+        void main() {
+            uv = gl_MultiTexCoord0.xy;
+            tint = gl_Color;
+            gl_Position = gl_ModelViewProjectionMatrix * gl_Vertex;
+        }
+        '''
+
+water_shader = {
+    "vertex_shader" : surface_vertex_shader,
+
+    "fragment_shader" : '''
+        #version 120
+
+        varying vec2 uv;
+        varying vec4 tint;
+
+        uniform float time;
+        uniform vec2 size;      // quad size in pixels, keeps ripples round
+
+        void main() {
+            vec2 p = uv * size / 48.0;
+            float t = time * 0.8;
+
+            // a few crossing wave trains, each bent by the other
+            float w = sin(p.x * 1.3 + t + sin(p.y * 0.9 - t * 0.7) * 1.5);
+            w += sin(p.y * 1.7 - t * 1.2 + sin(p.x * 1.1 + t * 0.5) * 1.2);
+            w += 0.5 * sin((p.x + p.y) * 2.3 + t * 1.6);
+            w /= 2.5;
+
+            // thin bright crests, like the caustics in the old flipbook
+            float crest = pow(1.0 - abs(w), 6.0);
+            vec3 water = mix(vec3(0.55, 0.6, 0.65), vec3(1.0), 0.35 + 0.25 * w);
+            water += vec3(0.35) * crest;
+            gl_FragColor = vec4(water, 1.0) * tint;
+        }
+        '''
+}
@@ -297,3 +297,11 @@ class GuiUtils:
     def add_spacing(self, height=10):
         """Add vertical space"""
         imgui.dummy(0, height)
+
+    def render_loading_screen(self, title, fraction):
+        """Render a progress bar while a biome's assets load"""
+        if self.begin_centered_window("Loading", 340, 120):
+            self.draw_text_centered(title)
+            self.add_spacing(10)
+            imgui.progress_bar(fraction, (300, 20), f"{int(fraction * 100)}%")
+            imgui.end()
@@ -8,8 +8,13 @@ from imgui.integrations.pygame import PygameRenderer
 from river_biome.game import RiverCrossingGame
 from space_biome.game import SpaceCrossingGame
 from squid_biome.game import SquidCrossingGame
+import river_biome.game as river_game
+import space_biome.game as space_game
+import squid_biome.game as squid_game
 from asset_maker.maker import load_shapes, draw_stroke, draw_at
 from gui_utils import GuiUtils
+from utils.graphics import StaticLayer
+from utils.loader import Prefetcher, manifest_loader, recent_order, remember_played
 
 # Constants
 WINDOW_WIDTH = 800
@@ -45,6 +50,15 @@ try:
 except Exception as e:
     print(f"Error loading background: {e}")
     BG = None
+BG_LAYER = None
+
+# Biome assets, prefetched in the background while the main menu is up
+MANIFESTS = {
+    "river": river_game.MANIFEST,
+    "space": space_game.MANIFEST,
+    "squid": squid_game.MANIFEST,
+}
+PREFETCH = None
 
 def init_opengl():
     """Initialize OpenGL settings"""
@@ -69,14 +83,66 @@ def init_imgui():
 
     return impl
 
+def draw_menu_scenery():
+    draw_at(BG, -128, -145,1.27,1.45)
+
 def draw_background():
-    """Draw the background"""
+    """Draw the background (rendered once into a texture, then blitted)"""
+    global BG_LAYER
     if BG is not None:
+        if BG_LAYER is None:
+            BG_LAYER = StaticLayer(draw_menu_scenery, WINDOW_WIDTH, WINDOW_HEIGHT)
         glPushMatrix()
         glLoadIdentity()
-        draw_at(BG, -128, -145,1.27,1.45)
+        BG_LAYER.draw()
         glPopMatrix()
 
+def prefetch_biomes():
+    """Warm the biomes' assets a little each menu frame, most recently played first"""
+    global PREFETCH
+    if PREFETCH is None:
+        PREFETCH = Prefetcher(MANIFESTS, recent_order(list(MANIFESTS)))
+    PREFETCH.pump()
+
+def release_prefetch(played):
+    """The started game holds its own references now; drop the prefetched ones"""
+    global PREFETCH
+    remember_played(played)
+    if PREFETCH is not None:
+        PREFETCH.release()
+        PREFETCH = None
+
+def play_music(path):
+    """Play a music file, from memory if the prefetcher has read it"""
+    mixer.music.load(PREFETCH.music_source(path) if PREFETCH is not None else path)
+    mixer.music.play(-1)
+    mixer.music.set_volume(1)
+
+def preload_biome(gui, impl, title, manifest):
+    """Load whatever of a biome's manifest is not resident yet while showing a loading bar"""
+    loader = manifest_loader(manifest)
+    clock = pygame.time.Clock()
+    try:
+        while not loader.pump():
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+                impl.process_event(event)
+
+            glClear(GL_COLOR_BUFFER_BIT)
+            draw_background()
+            imgui.new_frame()
+            gui.render_loading_screen(title, loader.progress())
+            imgui.render()
+            impl.render(imgui.get_draw_data())
+            pygame.display.flip()
+            clock.tick(FPS)
+    except BaseException:
+        loader.release()
+        raise
+    return loader
+
 def render_main_menu(gui: GuiUtils):
     """Render the main menu"""
     selection = None
@@ -86,9 +152,7 @@ def render_main_menu(gui: GuiUtils):
         gui.add_spacing(10)
         
         if gui.draw_centered_button("River Biome", 260, 50):
-            mixer.music.load("assets/sounds/river.mp3")
-            mixer.music.play(-1)
-            mixer.music.set_volume(1)
+            play_music(MANIFESTS["river"]["music"])
             
             selection = "river"
         
@@ -96,16 +160,12 @@ def render_main_menu(gui: GuiUtils):
         
         # Disabled buttons
         if gui.draw_centered_button("Space Biome", 260, 50):
-            mixer.music.load("assets/sounds/space.mp3")
-            mixer.music.play(-1)
-            mixer.music.set_volume(1)
+            play_music(MANIFESTS["space"]["music"])
             
             selection = "space"
         gui.add_spacing(10)
         if gui.draw_centered_button("Squid Biome ", 260, 50):
-            mixer.music.load("assets/sounds/rock.mp3")
-            mixer.music.play(-1)
-            mixer.music.set_volume(1)
+            play_music(MANIFESTS["squid"]["music"])
             
             selection = "squid"
         gui.add_spacing(10)
@@ -180,6 +240,7 @@ def main():
         
         # Handle menu states
         if current_menu == "main":
+            prefetch_biomes()
             selection = render_main_menu(gui)
             if selection == "river":
                 current_menu = "river"
@@ -196,7 +257,11 @@ def main():
             try:
                 imgui.render()
                 impl.render(imgui.get_draw_data())
+                loader = preload_biome(gui, impl, "River Biome", MANIFESTS["river"])
                 game = RiverCrossingGame(gui,impl)
+                # the game holds its own references now
+                loader.release()
+                release_prefetch("river")
                 game.paused=True
                 status=game.game_loop()
                 if(status==True):
@@ -214,7 +279,11 @@ def main():
             try:
                 imgui.render()
                 impl.render(imgui.get_draw_data())
+                loader = preload_biome(gui, impl, "Space Biome", MANIFESTS["space"])
                 game = SpaceCrossingGame(gui,impl)
+                # the game holds its own references now
+                loader.release()
+                release_prefetch("space")
                 game.paused=True
                 status=game.game_loop()
                 if(status==True):
@@ -228,7 +297,11 @@ def main():
                 imgui.render()
                 impl.render(imgui.get_draw_data())
 
+                loader = preload_biome(gui, impl, "Squid Biome", MANIFESTS["squid"])
                 game = SquidCrossingGame(gui,impl)
+                # the game holds its own references now
+                loader.release()
+                release_prefetch("squid")
                 game.paused=True
                 
                 status=game.game_loop()
@@ -7,10 +7,17 @@ import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from asset_maker.maker import load_shapes, draw_stroke,draw_at
+from asset_maker.maker import draw_stroke,draw_at
+from asset_maker.instancing import InstanceBatch
+from asset_maker.shadow import release_shadows
+from asset_maker.culling import cull_stats, reset_cull_stats
 from assets.objects.objects import Platform, Player,Crocodile
+from assets.objects.platform_field import PlatformField
 from gui_utils import GuiUtils
-from utils.graphics import draw_grass,load_texture,draw_animated_river,draw_river,textured_grass
+from utils.assets import exit_report, shape_assets
+from utils.effects import AnimatedSurface, toggle_procedural
+from utils.graphics import draw_grass,load_texture,draw_river,textured_grass,flush_batches,textures
+from utils.timestep import FixedTimestep, Interpolator
 import os
 # -------------------------------------------------
 # Constants & Setup
@@ -30,6 +37,31 @@ NUM_COLUMNS = 6
 CELL_WIDTH = (RIVER_END_X - RIVER_START_X) / NUM_COLUMNS
 ROW_Y = [WINDOW_HEIGHT/3, WINDOW_HEIGHT/2, (2*WINDOW_HEIGHT)/3]
 
+# Textures this biome uses.
+WATER_FRAMES = [f"assets/textures/water/{i:04d}.png" for i in range(40)]
+GRASS_TEXTURE = "assets/textures/grass/Grass10.png"
+# Grass only ever covers a bank, so a bank-sized mipmapped variant is loaded instead of the 2048px source.
+GRASS_SIZE = (LEFT_BANK_WIDTH, WINDOW_HEIGHT)
+
+# Everything the biome loads, so main can prefetch it from the menu (see utils.loader).
+MANIFEST = {
+    "shapes": [
+        "shapes.json",
+        "assets/shapes/wood.json",
+        "assets/shapes/coin.json",
+        "assets/objects/crocodile_shape.json",
+        "assets/shapes/ufo1.json",
+        "assets/shapes/ufo2.json",
+        "assets/objects/player_shape.json",
+        "assets/shapes/space_man.json",
+        "assets/shapes/space_man_rocket.json",
+    ],
+    "textures": [(GRASS_TEXTURE, GRASS_SIZE)],
+    # flipbooks are only loaded when the procedural surface shaders are off
+    "flipbooks": [WATER_FRAMES],
+    "music": "assets/sounds/river.mp3",
+}
+
 # -------------------------------------------------
 # Updated Levels Configuration (Speeds Multiplied by 60)
 # -------------------------------------------------
@@ -76,12 +108,14 @@ LEVELS = [
 
 
 class RiverCrossingGame:
-    def __init__(self,gui:GuiUtils=None,impl=None):
+    def __init__(self,gui:GuiUtils=None,impl=None, headless=False):
+        # headless: game state only, no GL resources (see utils/headless.py)
+        self.headless = headless
         self.levels = LEVELS
         self.currentLevelIdx = 0
-        self.shapes = load_shapes("shapes.json")
+        self.shapes = shape_assets.get("shapes.json")
         # assets\shapes\wood.json
-        self.platformShape = load_shapes("assets\shapes\wood.json")
+        self.platformShape = shape_assets.get("assets/shapes/wood.json")
         # self.shapes = [flip_shape_horizontally(shape, WINDOW_WIDTH) for shape in self.shapes]
     
         self.gameOver = False
@@ -89,8 +123,15 @@ class RiverCrossingGame:
         
         # self.river_textures = [if i<=9:load_texture(f"assets/textures/water/000{i}.png") else:load_texture(f"assets/textures/water/00{i}.png") for i in range(39)]
         # if i<=9:load_texture(f"assets/textures/water/000{i}.png") else:load_texture(f"assets/textures/water/00{i}.png")
-        self.river_textures = [load_texture(f"assets/textures/water/000{i}.png") if i<=9 else load_texture(f"assets/textures/water/00{i}.png") for i in range(40)]
-        self.grass_texture = load_texture("assets/textures/grass/Grass10.png")
+        # procedural water shader; the 40-frame atlas is only loaded if toggled back (F2)
+        self.water = AnimatedSurface("water", WATER_FRAMES, (0.0, 0.7, 1.0, 1.0))
+        self.grass_texture = None if headless else textures.acquire(GRASS_TEXTURE, size=GRASS_SIZE)
+        # platforms, coins and enemies are queued here and drawn one shape type at a time
+        self.instances = InstanceBatch()
+        self.cull_stats = cull_stats()
+        # physics runs in fixed steps; positions are drawn blended between the last two
+        self.timestep = FixedTimestep()
+        self.motion = Interpolator()
 
         self.paused = False
         self.gui = gui
@@ -218,7 +259,7 @@ class RiverCrossingGame:
             self.currentLevelIdx = game_state['level']
             
             # Restore platforms
-            self.platforms = []
+            self.platforms = PlatformField()
             for p_data in game_state['platforms']:
                 p = Platform(p_data['row'], p_data['col'], 
                            p_data['leftBound'], p_data['rightBound'], 
@@ -363,7 +404,7 @@ class RiverCrossingGame:
 
     def load_level(self):
         self.player = Player()
-        self.platforms = []
+        self.platforms = PlatformField()
         levelData = self.levels[self.currentLevelIdx]
         for pd in levelData["platforms"]:
             p = Platform(
@@ -387,54 +428,24 @@ class RiverCrossingGame:
         self.gameOver = False
         self.win = False
 
+    def moving_entities(self):
+        """Everything whose position the simulation changes, for render interpolation."""
+        return list(self.platforms) + self.enemies + [self.player]
+
     def update(self, dt, keys):
 
-        if keys[pygame.K_ESCAPE]:
-            self.paused = not self.paused
-            return
-        
         if self.paused:
             return
 
-        for p in self.platforms:
-            p.update(dt)
+        # move every platform and turn them at their bounds
+        self.platforms.move(dt)
 
         for crocodile in self.enemies:
             crocodile.update(dt,self.platforms)
-        # Platform collisions: if two overlap, reverse their vx immediately.
-        collision_padding = 0.5  # Small extra distance to prevent sticking
-
-        for i in range(len(self.platforms)):
-            for j in range(i + 1, len(self.platforms)):
-                p1 = self.platforms[i]
-                p2 = self.platforms[j]
-                dx = p1.x - p2.x
-                dy = p1.y - p2.y
-                distance = math.hypot(dx, dy)
-                min_distance = p1.radius + p2.radius + collision_padding
-
-                # Only process collision if moving towards each other horizontally.
-                if distance < min_distance:
-                    # Reverse horizontal velocities only if they're moving towards one another.
-                    if (p1.vx > 0 and p2.vx < 0) or (p1.vx < 0 and p2.vx > 0):
-                        p1.vx = -p1.vx
-                        p2.vx = -p2.vx
-
-                    # Apply a gentle separation to reduce overlap:
-                    if distance == 0:
-                        # Prevent division by zero
-                        distance = 0.1
-                    overlap = (min_distance - distance)
-                    # Calculate normalized displacement.
-                    nx = dx / distance
-                    ny = dy / distance
-                    # Apply a fraction of the overlap to each platform.
-                    correction_factor = 0.25  # Tune this factor as needed.
-                    p1.x += nx * overlap * correction_factor
-                    p1.y += ny * overlap * correction_factor
-                    p2.x -= nx * overlap * correction_factor
-                    p2.y -= ny * overlap * correction_factor
-                    
+
+        # Platform collisions: overlapping platforms moving towards each other reverse,
+        # and every overlapping pair is eased apart.
+        self.platforms.resolve_overlaps()
 
         self.player.update(dt, keys, self.platforms)
 
@@ -491,25 +502,33 @@ class RiverCrossingGame:
         # glVertex2f(RIVER_START_X, WINDOW_HEIGHT)
         # glEnd()
         # draw_river(RIVER_START_X, 0, RIVER_END_X, 0, RIVER_END_X, WINDOW_HEIGHT, RIVER_START_X, WINDOW_HEIGHT)
-        draw_animated_river(RIVER_START_X, 0, RIVER_END_X, 0, RIVER_END_X, WINDOW_HEIGHT, RIVER_START_X, WINDOW_HEIGHT, self.river_textures)
+        self.water.draw(RIVER_START_X, 0, RIVER_END_X, 0, RIVER_END_X, WINDOW_HEIGHT, RIVER_START_X, WINDOW_HEIGHT)
 
         # 2) Draw the shapes from test.py
         # for shape in self.shapes:
         #     draw_ST(shape, 0, 100)
         draw_at(self.shapes, 0, 100)
-        # 3) Draw the platforms
-        for p in self.platforms:
-            p.draw()
+        # moving things are drawn between their last two simulated positions
+        with self.motion.blended(self.timestep.alpha):
+            # 3) Draw the platforms
+            for p in self.platforms:
+                p.draw(self.instances)
+            self.instances.flush()
 
-        # 4) Draw the player
-        self.player.draw()
+            # 4) Draw the player
+            self.player.draw()
 
-        # 5) draw the enemies
-        for crocodile in self.enemies:
-            crocodile.draw()
+            # 5) draw the enemies
+            for crocodile in self.enemies:
+                crocodile.draw(self.instances)
+            self.instances.flush()
 
         # Flush to finish drawing
+        flush_batches()
         glFlush()
+        # shapes and mesh batches skipped off-screen this frame, for profiling
+        self.cull_stats = cull_stats()
+        reset_cull_stats()
 
 
     def is_game_over(self):
@@ -546,6 +565,13 @@ class RiverCrossingGame:
       
         return True
     
+    def release(self):
+        """Gives back the GL resources this game holds; called when returning to the menu."""
+        self.water.release()
+        textures.release(self.grass_texture)
+        release_shadows()
+        exit_report()
+
     def game_loop(self):
         impl=self.impl
         # pygame.init()
@@ -576,6 +602,10 @@ class RiverCrossingGame:
                     if event.key == K_SPACE:
                         if not self.paused:
                             self.player.start_jump()
+                    elif event.key == K_ESCAPE and self.story_shown:
+                        self.paused = True
+                    elif event.key == K_F2:
+                        toggle_procedural()
 
             # if not overlay_displayed:
             #     self.update(dt, keys)
@@ -607,6 +637,7 @@ class RiverCrossingGame:
                         print("Game loaded successfully!")
                         self.paused = False
                 elif pause_choice == "exit":
+                    self.release()
                     mixer=pygame.mixer
                     mixer.music.load("assets/sounds/bg.mp3")
                     mixer.music.play(-1)
@@ -615,21 +646,29 @@ class RiverCrossingGame:
                     return True
                     running = False
             if not self.paused and not overlay_displayed  and self.story_shown== True:
-                self.update(dt, keys)
-                if self.is_game_over():
-                    # overlay_displayed = True
-                    print("Game Over!")
-                    self.paused = True
-                    # return
-                elif self.is_win() :
-                    if not self.next_level():
-                        if(self.story_shown==True):
-                            print("Congratulations! You completed all levels!")
-                            self.paused = True
-
-                        # running = False
-                    else:
-                        print("Level Complete! Next level loaded.")
+                # as many fixed steps as the frame took; the game may end part way through
+                for _ in range(self.timestep.advance(dt)):
+                    self.motion.snapshot(self.moving_entities())
+                    self.update(self.timestep.step, keys)
+                    if self.is_game_over():
+                        # overlay_displayed = True
+                        print("Game Over!")
+                        self.paused = True
+                        break
+                    elif self.is_win() :
+                        if not self.next_level():
+                            if(self.story_shown==True):
+                                print("Congratulations! You completed all levels!")
+                                self.paused = True
+
+                            # running = False
+                        else:
+                            print("Level Complete! Next level loaded.")
+                        break
+            else:
+                # no time banks up while paused or reading the story
+                self.timestep.reset()
+                self.motion.clear()
 
             self.draw_gui()
 
@@ -7,10 +7,16 @@ import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from asset_maker.maker import load_shapes, draw_stroke, draw_at
+from asset_maker.maker import draw_stroke, draw_at
+from asset_maker.instancing import InstanceBatch
+from asset_maker.shadow import release_shadows
+from asset_maker.culling import cull_stats, reset_cull_stats
 from assets.objects.objects import Platform, Player, Crocodile
+from assets.objects.platform_field import PlatformField
 from gui_utils import GuiUtils
-from utils.graphics import draw_animated_space, draw_grass, load_texture, textured_grass, draw_animated_river
+from utils.assets import exit_report, shape_assets
+from utils.graphics import draw_animated_space, draw_grass, load_texture, textured_grass, draw_animated_river, StaticLayer, flush_batches
+from utils.timestep import FixedTimestep, Interpolator
 import os
 
 # -------------------------------------------------
@@ -30,6 +36,25 @@ NUM_COLUMNS = 6
 CELL_WIDTH = (SPACE_END_X - SPACE_START_X) / NUM_COLUMNS
 ROW_Y = [WINDOW_HEIGHT / 3, WINDOW_HEIGHT / 2, (2 * WINDOW_HEIGHT) / 3]
 
+# Everything the biome loads, so main can prefetch it from the menu (see utils.loader).
+MANIFEST = {
+    "shapes": [
+        "shapes.json",
+        "assets/shapes/space_rock.json",
+        "assets/shapes/coin.json",
+        "assets/shapes/ufo1.json",
+        "assets/shapes/ufo2.json",
+        "assets/shapes/space_man.json",
+        "assets/shapes/space_man_rocket.json",
+        "assets/shapes/starry_sky.json",
+        "assets/shapes/space_bank.json",
+    ],
+    # the banks and sky are shapes, and nothing here is animated by a texture
+    "textures": [],
+    "flipbooks": [],
+    "music": "assets/sounds/space.mp3",
+}
+
 # -------------------------------------------------
 # Updated Levels Configuration (Speeds Multiplied by 60)
 # -------------------------------------------------
@@ -74,23 +99,30 @@ LEVELS = [
 # -------------------------------------------------
 
 class SpaceCrossingGame:
-    def __init__(self, gui: GuiUtils = None, impl=None):
+    def __init__(self, gui: GuiUtils = None, impl=None, headless=False):
+        # headless: game state only, no GL resources (see utils/headless.py)
+        self.headless = headless
         self.levels = LEVELS
         self.currentLevelIdx = 0
         self.need_coins = 3
-        self.shapes = load_shapes("shapes.json")
-        self.space_rock_shape = load_shapes("assets/shapes/space_rock.json")
-        self.ufo_shapes = [load_shapes("assets/shapes/ufo1.json"), load_shapes("assets/shapes/ufo2.json")]
-        self.space_man_shape = load_shapes("assets/shapes/space_man.json")
+        self.shapes = shape_assets.get("shapes.json")
+        self.space_rock_shape = shape_assets.get("assets/shapes/space_rock.json")
+        self.ufo_shapes = [shape_assets.get("assets/shapes/ufo1.json"), shape_assets.get("assets/shapes/ufo2.json")]
+        self.space_man_shape = shape_assets.get("assets/shapes/space_man.json")
         self.load_level()
         self.gameOver = False
         self.win = False
 
-        self.space_textures = [load_texture(f"assets/textures/water/000{i}.png") if i <= 9 else load_texture(f"assets/textures/water/00{i}.png") for i in range(40)]
-        self.grass_texture = load_texture("assets/textures/grass/Grass10.png")
-
-        self.space_bg = load_shapes("assets/shapes/starry_sky.json")
-        self.space_bank = load_shapes("assets/shapes/space_bank.json")
+        self.space_bg = shape_assets.get("assets/shapes/starry_sky.json")
+        self.space_bank = shape_assets.get("assets/shapes/space_bank.json")
+        # sky and banks never change, so they are rendered once into a texture
+        self.scenery = StaticLayer(self.draw_scenery, WINDOW_WIDTH, WINDOW_HEIGHT)
+        # platforms, coins and enemies are queued here and drawn one shape type at a time
+        self.instances = InstanceBatch()
+        self.cull_stats = cull_stats()
+        # physics runs in fixed steps; positions are drawn blended between the last two
+        self.timestep = FixedTimestep()
+        self.motion = Interpolator()
 
         self.paused = False
         self.gui = gui
@@ -209,7 +241,7 @@ class SpaceCrossingGame:
             self.currentLevelIdx = game_state['level']
 
             # Restore platforms
-            self.platforms = []
+            self.platforms = PlatformField()
             for p_data in game_state['platforms']:
                 p = Platform(p_data['row'], p_data['col'],
                              p_data['leftBound'], p_data['rightBound'],
@@ -316,7 +348,7 @@ class SpaceCrossingGame:
 
     def load_level(self):
         self.player = Player(speed=100, shape=self.space_man_shape, inspace=True)
-        self.platforms = []
+        self.platforms = PlatformField()
         levelData = self.levels[self.currentLevelIdx]
         self.need_coins = levelData["need_coins"]
         for pd in levelData["platforms"]:
@@ -343,46 +375,23 @@ class SpaceCrossingGame:
         self.gameOver = False
         self.win = False
 
-    def update(self, dt, keys):
-        if keys[pygame.K_ESCAPE]:
-            self.paused = not self.paused
-            return
+    def moving_entities(self):
+        """Everything whose position the simulation changes, for render interpolation."""
+        return list(self.platforms) + self.enemies + [self.player]
 
+    def update(self, dt, keys):
         if self.paused:
             return
 
-        for p in self.platforms:
-            p.update(dt)
+        # move every platform and turn them at their bounds
+        self.platforms.move(dt)
 
         for crocodile in self.enemies:
             crocodile.update(dt, self.platforms)
 
-        collision_padding = 0.5
-
-        for i in range(len(self.platforms)):
-            for j in range(i + 1, len(self.platforms)):
-                p1 = self.platforms[i]
-                p2 = self.platforms[j]
-                dx = p1.x - p2.x
-                dy = p1.y - p2.y
-                distance = math.hypot(dx, dy)
-                min_distance = p1.radius + p2.radius + collision_padding
-
-                if distance < min_distance:
-                    if (p1.vx > 0 and p2.vx < 0) or (p1.vx < 0 and p2.vx > 0):
-                        p1.vx = -p1.vx
-                        p2.vx = -p2.vx
-
-                    if distance == 0:
-                        distance = 0.1
-                    overlap = (min_distance - distance)
-                    nx = dx / distance
-                    ny = dy / distance
-                    correction_factor = 0.25
-                    p1.x += nx * overlap * correction_factor
-                    p1.y += ny * overlap * correction_factor
-                    p2.x -= nx * overlap * correction_factor
-                    p2.y -= ny * overlap * correction_factor
+        # Platform collisions: overlapping platforms moving towards each other reverse,
+        # and every overlapping pair is eased apart.
+        self.platforms.resolve_overlaps()
 
         self.player.space_update(dt, keys, self.platforms)
 
@@ -410,20 +419,31 @@ class SpaceCrossingGame:
         if self.player.x >= WINDOW_WIDTH - 40 and self.player.coins >= self.need_coins:
             self.win = True
 
-    def draw(self):
+    def draw_scenery(self):
         draw_at(self.space_bg, -50, -90, 1.2, 1.2)
         draw_at(self.space_bank, -260, -100, 0.8, 1.2)
         draw_at(self.space_bank, 1060, -100, -0.8, 1.2)
 
-        for p in self.platforms:
-            p.draw()
+    def draw(self):
+        self.scenery.draw()
 
-        self.player.draw()
+        # moving things are drawn between their last two simulated positions
+        with self.motion.blended(self.timestep.alpha):
+            for p in self.platforms:
+                p.draw(self.instances)
+            self.instances.flush()
 
-        for crocodile in self.enemies:
-            crocodile.draw()
+            self.player.draw()
+
+            for crocodile in self.enemies:
+                crocodile.draw(self.instances)
+            self.instances.flush()
 
+        flush_batches()
         glFlush()
+        # shapes and mesh batches skipped off-screen this frame, for profiling
+        self.cull_stats = cull_stats()
+        reset_cull_stats()
 
     def is_game_over(self):
         return self.gameOver
@@ -446,6 +466,12 @@ class SpaceCrossingGame:
         self.load_level()
         return True
 
+    def release(self):
+        """Gives back the GL resources this game holds; called when returning to the menu."""
+        self.scenery.release()
+        release_shadows()
+        exit_report()
+
     def game_loop(self):
         impl = self.impl
         clock = pygame.time.Clock()
@@ -466,6 +492,8 @@ class SpaceCrossingGame:
                 elif event.type == KEYDOWN:
                     if event.key == K_LSHIFT or event.key == K_SPACE:
                         self.player.toggle_hover()
+                    elif event.key == K_ESCAPE and self.story_shown:
+                        self.paused = True
                 elif event.type == KEYUP:
                     if event.key == K_LSHIFT or event.key == K_SPACE:
                         self.player.toggle_hover()
@@ -486,6 +514,7 @@ class SpaceCrossingGame:
                         print("Game loaded successfully!")
                         self.paused = False
                 elif pause_choice == "exit":
+                    self.release()
                     mixer=pygame.mixer
                     mixer.music.load("assets/sounds/bg.mp3")
                     mixer.music.play(-1)
@@ -495,17 +524,26 @@ class SpaceCrossingGame:
                     running = False
 
             if not self.paused and not overlay_displayed and self.story_shown == True:
-                self.update(dt, keys)
-                if self.is_game_over():
-                    print("Game Over!")
-                    self.paused = True
-                elif self.is_win():
-                    if not self.next_level():
-                        if self.story_shown == True:
-                            print("Congratulations! You completed all levels!")
-                            self.paused = True
-                    else:
-                        print("Level Complete! Next level loaded.")
+                # as many fixed steps as the frame took; the game may end part way through
+                for _ in range(self.timestep.advance(dt)):
+                    self.motion.snapshot(self.moving_entities())
+                    self.update(self.timestep.step, keys)
+                    if self.is_game_over():
+                        print("Game Over!")
+                        self.paused = True
+                        break
+                    elif self.is_win():
+                        if not self.next_level():
+                            if self.story_shown == True:
+                                print("Congratulations! You completed all levels!")
+                                self.paused = True
+                        else:
+                            print("Level Complete! Next level loaded.")
+                        break
+            else:
+                # no time banks up while paused or reading the story
+                self.timestep.reset()
+                self.motion.clear()
 
             self.draw_gui()
 
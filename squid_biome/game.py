@@ -7,10 +7,16 @@ import pygame
 from pygame.locals import *
 from OpenGL.GL import *
 from OpenGL.GLU import *
-from asset_maker.maker import load_shapes, draw_stroke, draw_at
+from asset_maker.maker import draw_stroke, draw_at
+from asset_maker.instancing import InstanceBatch
+from asset_maker.shadow import release_shadows
+from asset_maker.culling import cull_stats, reset_cull_stats
 from assets.objects.objects import Platform, Player, Crocodile, Doll
+from assets.objects.platform_field import PlatformField
 from gui_utils import GuiUtils
-from utils.graphics import draw_grass, load_texture, textured_grass, draw_animated_river
+from utils.assets import exit_report, shape_assets
+from utils.graphics import draw_grass, load_texture, textured_grass, draw_animated_river, StaticLayer, flush_batches
+from utils.timestep import FixedTimestep, Interpolator
 import os
 
 # -------------------------------------------------
@@ -30,6 +36,31 @@ NUM_COLUMNS = 6
 CELL_WIDTH = (SQUID_END_X - SQUID_START_X) / NUM_COLUMNS
 ROW_Y = [WINDOW_HEIGHT / 3, WINDOW_HEIGHT / 2, (2 * WINDOW_HEIGHT) / 3]
 
+# Everything the biome loads, so main can prefetch it from the menu (see utils.loader).
+MANIFEST = {
+    "shapes": [
+        "shapes.json",
+        "assets/shapes/squid_player.json",
+        "assets/shapes/sky.json",
+        "assets/shapes/squid_bank.json",
+        "assets/shapes/squid_bg.json",
+        "assets/shapes/wood.json",
+        "assets/shapes/coin.json",
+        "assets/objects/crocodile_shape.json",
+        "assets/shapes/bird.json",
+        "assets/shapes/ufo1.json",
+        "assets/shapes/ufo2.json",
+        "assets/shapes/space_man.json",
+        "assets/shapes/space_man_rocket.json",
+        "assets/shapes/doll_green.json",
+        "assets/shapes/doll_red.json",
+    ],
+    # the banks and sky are shapes, and nothing here is animated by a texture
+    "textures": [],
+    "flipbooks": [],
+    "music": "assets/sounds/rock.mp3",
+}
+
 # -------------------------------------------------
 # Updated Levels Configuration (Speeds Multiplied by 60)
 # -------------------------------------------------
@@ -79,22 +110,29 @@ LEVELS = [
 # -------------------------------------------------
 
 class SquidCrossingGame:
-    def __init__(self, gui: GuiUtils = None, impl=None):
+    def __init__(self, gui: GuiUtils = None, impl=None, headless=False):
+        # headless: game state only, no GL resources (see utils/headless.py)
+        self.headless = headless
         self.levels = LEVELS
         self.currentLevelIdx = 0
         self.need_coins = 3
-        self.shapes = load_shapes("shapes.json")
-        self.player_shape = load_shapes("assets/shapes/squid_player.json")
-        self.squid_sky = load_shapes("assets/shapes/sky.json")
-        self.squid_bank = load_shapes("assets/shapes/squid_bank.json")
-        self.squid_shape = load_shapes("assets/shapes/squid_bg.json")
+        self.shapes = shape_assets.get("shapes.json")
+        self.player_shape = shape_assets.get("assets/shapes/squid_player.json")
+        self.squid_sky = shape_assets.get("assets/shapes/sky.json")
+        self.squid_bank = shape_assets.get("assets/shapes/squid_bank.json")
+        self.squid_shape = shape_assets.get("assets/shapes/squid_bg.json")
+        # background, sky and banks never change, so they are rendered once into a texture
+        self.scenery = StaticLayer(self.draw_scenery, WINDOW_WIDTH, WINDOW_HEIGHT)
+        # platforms, coins and enemies are queued here and drawn one shape type at a time
+        self.instances = InstanceBatch()
+        self.cull_stats = cull_stats()
+        # physics runs in fixed steps; positions are drawn blended between the last two
+        self.timestep = FixedTimestep()
+        self.motion = Interpolator()
         self.load_level()
         self.gameOver = False
         self.win = False
 
-        self.squid_textures = [load_texture(f"assets/textures/water/000{i}.png") if i <= 9 else load_texture(f"assets/textures/water/00{i}.png") for i in range(40)]
-        self.grass_texture = load_texture("assets/textures/grass/Grass10.png")
-
         self.paused = False
         self.gui = gui
         self.impl = impl
@@ -215,7 +253,7 @@ class SquidCrossingGame:
             self.currentLevelIdx = game_state['level']
 
             # Restore platforms
-            self.platforms = []
+            self.platforms = PlatformField()
             for p_data in game_state['platforms']:
                 p = Platform(p_data['row'], p_data['col'],
                              p_data['leftBound'], p_data['rightBound'],
@@ -321,7 +359,7 @@ class SquidCrossingGame:
     def load_level(self):
         self.player = Player(speed=100, shape=self.player_shape)
         self.doll = Doll()
-        self.platforms = []
+        self.platforms = PlatformField()
         levelData = self.levels[self.currentLevelIdx]
         self.need_coins = levelData["need_coins"]
         for pd in levelData["platforms"]:
@@ -347,46 +385,23 @@ class SquidCrossingGame:
         self.gameOver = False
         self.win = False
 
-    def update(self, dt, keys):
-        if keys[pygame.K_ESCAPE]:
-            self.paused = not self.paused
-            return
+    def moving_entities(self):
+        """Everything whose position the simulation changes, for render interpolation."""
+        return list(self.platforms) + self.enemies + [self.player]
 
+    def update(self, dt, keys):
         if self.paused:
             return
 
-        for p in self.platforms:
-            p.update(dt)
+        # move every platform and turn them at their bounds
+        self.platforms.move(dt)
 
         for crocodile in self.enemies:
             crocodile.update(dt, self.platforms)
 
-        collision_padding = 0.5
-
-        for i in range(len(self.platforms)):
-            for j in range(i + 1, len(self.platforms)):
-                p1 = self.platforms[i]
-                p2 = self.platforms[j]
-                dx = p1.x - p2.x
-                dy = p1.y - p2.y
-                distance = math.hypot(dx, dy)
-                min_distance = p1.radius + p2.radius + collision_padding
-
-                if distance < min_distance:
-                    if (p1.vx > 0 and p2.vx < 0) or (p1.vx < 0 and p2.vx > 0):
-                        p1.vx = -p1.vx
-                        p2.vx = -p2.vx
-
-                    if distance == 0:
-                        distance = 0.1
-                    overlap = (min_distance - distance)
-                    nx = dx / distance
-                    ny = dy / distance
-                    correction_factor = 0.25
-                    p1.x += nx * overlap * correction_factor
-                    p1.y += ny * overlap * correction_factor
-                    p2.x -= nx * overlap * correction_factor
-                    p2.y -= ny * overlap * correction_factor
+        # Platform collisions: overlapping platforms moving towards each other reverse,
+        # and every overlapping pair is eased apart.
+        self.platforms.resolve_overlaps()
 
         self.player.space_update(dt, keys, self.platforms)
         self.doll.update(dt)
@@ -415,23 +430,34 @@ class SquidCrossingGame:
         if self.player.x >= WINDOW_WIDTH - 40 and self.player.coins >= self.need_coins:
             self.win = True
 
-    def draw(self):
+    def draw_scenery(self):
         draw_at(self.squid_shape, -220, -180, 1.5, 1.5)
         draw_at(self.squid_sky, -200, -180, 1.5, 1.2)
         draw_at(self.squid_bank, -320, -200, 1, 1.5)
         draw_at(self.squid_bank, 1120, -200, -1, 1.5)
 
-        for p in self.platforms:
-            p.draw()
+    def draw(self):
+        self.scenery.draw()
 
-        self.player.draw()
+        # moving things are drawn between their last two simulated positions
+        with self.motion.blended(self.timestep.alpha):
+            for p in self.platforms:
+                p.draw(self.instances)
+            self.instances.flush()
 
-        for crocodile in self.enemies:
-            crocodile.draw()
+            self.player.draw()
+
+            for crocodile in self.enemies:
+                crocodile.draw(self.instances)
+            self.instances.flush()
 
-        self.doll.draw(self.player)
+            self.doll.draw(self.player)
 
+        flush_batches()
         glFlush()
+        # shapes and mesh batches skipped off-screen this frame, for profiling
+        self.cull_stats = cull_stats()
+        reset_cull_stats()
 
     def is_game_over(self):
         return self.gameOver
@@ -454,6 +480,12 @@ class SquidCrossingGame:
         self.load_level()
         return True
 
+    def release(self):
+        """Gives back the GL resources this game holds; called when returning to the menu."""
+        self.scenery.release()
+        release_shadows()
+        exit_report()
+
     def game_loop(self):
         impl = self.impl
         clock = pygame.time.Clock()
@@ -472,7 +504,8 @@ class SquidCrossingGame:
                     pygame.quit()
                     sys.exit()
                 elif event.type == KEYDOWN:
-                    pass
+                    if event.key == K_ESCAPE and self.story_shown:
+                        self.paused = True
 
             imgui.new_frame()
             pause_choice = self.render_pause_menu()
@@ -490,6 +523,7 @@ class SquidCrossingGame:
                         print("Game loaded successfully!")
                         self.paused = False
                 elif pause_choice == "exit":
+                    self.release()
                     mixer=pygame.mixer
                     mixer.music.load("assets/sounds/bg.mp3")
                     mixer.music.play(-1)
@@ -499,17 +533,26 @@ class SquidCrossingGame:
                     running = False
 
             if not self.paused and not overlay_displayed and self.story_shown == True:
-                self.update(dt, keys)
-                if self.is_game_over():
-                    print("Game Over!")
-                    self.paused = True
-                elif self.is_win():
-                    if not self.next_level():
-                        if self.story_shown == True:
-                            print("Congratulations! You completed all levels!")
-                            self.paused = True
-                    else:
-                        print("Level Complete! Next level loaded.")
+                # as many fixed steps as the frame took; the game may end part way through
+                for _ in range(self.timestep.advance(dt)):
+                    self.motion.snapshot(self.moving_entities())
+                    self.update(self.timestep.step, keys)
+                    if self.is_game_over():
+                        print("Game Over!")
+                        self.paused = True
+                        break
+                    elif self.is_win():
+                        if not self.next_level():
+                            if self.story_shown == True:
+                                print("Congratulations! You completed all levels!")
+                                self.paused = True
+                        else:
+                            print("Level Complete! Next level loaded.")
+                        break
+            else:
+                # no time banks up while paused or reading the story
+                self.timestep.reset()
+                self.motion.clear()
 
             self.draw_gui()
 
@@ -0,0 +1,113 @@
+import os
+import threading
+
+# -------------------------------------------------
+# Asset registry
+# -------------------------------------------------
+# Shapes used to be loaded in default arguments (parsed at import time, once per
+# signature) and again in constructors (once per entity). The registry loads each
+# file the first time it is asked for and hands out the same object afterwards.
+
+
+def asset_key(path):
+    """Normalises an asset path so "assets\\x.json" and "./assets/x.json" share one entry."""
+    return os.path.normcase(os.path.abspath(path.replace("\\", "/")))
+
+
+class AssetRegistry:
+    """
+    Lazy, memoized loading of one kind of asset: get(path) calls load(path) on the
+    first request for a file and returns the cached result from then on. The objects
+    handed out are shared, so callers must not modify them.
+    """
+
+    def __init__(self, load, name="asset"):
+        self.load = load
+        self.name = name
+        self.entries = {}   # key -> loaded asset
+        self.uses = {}      # key -> number of get() calls
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path):
+        key = asset_key(path)
+        self.uses[key] = self.uses.get(key, 0) + 1
+        return self._fetch(path, key)
+
+    def preload(self, path):
+        """Loads a file ahead of its first get() without counting it as a use (safe from worker threads)."""
+        key = asset_key(path)
+        if key not in self.entries:
+            self._fetch(path, key)
+
+    def _fetch(self, path, key):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        with self.lock:
+            # another thread may have loaded it while we waited
+            entry = self.entries.get(key)
+            if entry is None:
+                entry = self.entries[key] = self.load(path.replace("\\", "/"))
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def __contains__(self, path):
+        return asset_key(path) in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def clear(self):
+        self.entries.clear()
+        self.uses.clear()
+
+    def report(self):
+        print(f"{self.name} registry: {len(self.entries)} file(s) loaded, "
+              f"{self.hits} hit(s), {self.misses} load(s)")
+
+
+def _load_shape(path):
+    from asset_maker.maker import load_shapes  # pulls in the GL drawing code, so only when needed
+    from asset_maker.shape import Shape
+    return Shape.from_strokes(load_shapes(path), path)
+
+
+shape_assets = AssetRegistry(_load_shape, "shape")
+
+
+# Set to print the live textures and shape memory whenever a game is left.
+MEMORY_REPORT = bool(os.environ.get("RIVER_GAME_MEMORY_REPORT"))
+
+
+def exit_report():
+    """The memory reports the games print on release(), if RIVER_GAME_MEMORY_REPORT is set."""
+    if not MEMORY_REPORT:
+        return
+    from utils.graphics import textures
+    print("Live textures:\n" + textures.report())
+    shape_memory_report()
+
+
+def shape_memory_report(registry=shape_assets):
+    """
+    Prints what the registered shapes cost now (one frozen Shape per file) next to
+    what they cost as one list of stroke dicts of tuples per use, as they were loaded before.
+    """
+    from asset_maker.shape import dict_nbytes
+    print(f"{'shape file':40s} {'uses':>5s} {'dicts/use':>10s} {'before':>10s} {'after':>9s}")
+    before_total = after_total = 0
+    for key, shape in sorted(registry.entries.items()):
+        uses = registry.uses.get(key, 1)
+        per_use = dict_nbytes(shape)
+        after = shape.nbytes()
+        before_total += per_use * uses
+        after_total += after
+        name = os.path.relpath(key)
+        print(f"{name:40s} {uses:5d} {per_use:10d} {per_use * uses:10d} {after:9d}")
+    print(f"{'total':40s} {'':5s} {'':10s} {before_total:10d} {after_total:9d} bytes")
+    return before_total, after_total
@@ -0,0 +1,113 @@
+import time
+from OpenGL.GL import *
+from OpenGL.GL import shaders
+
+from assets.shaders.shaders import water_shader
+from utils.graphics import flush_batches, draw_animated_river, load_animated_texture, textures
+
+# -------------------------------------------------
+# Procedural animated surfaces (river water)
+# -------------------------------------------------
+# The shaders animate from a time uniform, so no flipbook frames have to be loaded
+# or rebound. F2 in the river game flips back to the 40-frame texture path for comparison.
+_settings = {"procedural": True}
+
+
+def procedural_enabled():
+    return _settings["procedural"]
+
+
+def set_procedural(enabled):
+    _settings["procedural"] = bool(enabled)
+
+
+def toggle_procedural():
+    set_procedural(not procedural_enabled())
+    print(f"Animated surfaces: {'procedural shaders' if procedural_enabled() else 'flipbook textures'}")
+
+
+class ShaderProgram:
+    """A GLSL program compiled on first use. If compiling fails it stays unavailable."""
+
+    def __init__(self, source, name):
+        self.source = source
+        self.name = name
+        self.program = None
+        self.failed = False
+        self.uniforms = {}
+
+    def available(self):
+        if self.program is None and not self.failed:
+            try:
+                self.program = shaders.compileProgram(
+                    shaders.compileShader(self.source["vertex_shader"], GL_VERTEX_SHADER),
+                    shaders.compileShader(self.source["fragment_shader"], GL_FRAGMENT_SHADER),
+                    validate=False)
+            except Exception as e:  # GLSL errors come back as RuntimeError/GLError with the log
+                print(f"Shader '{self.name}' unavailable, using textures: {e}")
+                self.failed = True
+        return self.program is not None
+
+    def uniform(self, name):
+        location = self.uniforms.get(name)
+        if location is None:
+            location = self.uniforms[name] = glGetUniformLocation(self.program, name)
+        return location
+
+
+_programs = {
+    "water": ShaderProgram(water_shader, "water"),
+}
+
+
+def draw_procedural_quad(program, x1, y1, x2, y2, x3, y3, x4, y4, color, now=None):
+    """Draws one quad with a procedural surface shader; uv runs 0..1 across it."""
+    if now is None:
+        now = time.time()
+    flush_batches()
+    width = max(abs(x2 - x1), abs(x3 - x4), 1.0)
+    height = max(abs(y4 - y1), abs(y3 - y2), 1.0)
+    glUseProgram(program.program)
+    # keep the float small enough not to lose precision after days of uptime
+    glUniform1f(program.uniform("time"), now % 3600.0)
+    glUniform2f(program.uniform("size"), width, height)
+    glColor4f(*color)
+    glBegin(GL_QUADS)
+    glTexCoord2f(0.0, 0.0)
+    glVertex2f(x1, y1)
+    glTexCoord2f(1.0, 0.0)
+    glVertex2f(x2, y2)
+    glTexCoord2f(1.0, 1.0)
+    glVertex2f(x3, y3)
+    glTexCoord2f(0.0, 1.0)
+    glVertex2f(x4, y4)
+    glEnd()
+    glUseProgram(0)
+
+
+class AnimatedSurface:
+    """
+    An animated quad (river water) drawn by a shader, or by the old
+    flipbook when shaders are toggled off or unavailable. The flipbook atlas is only
+    loaded the first time the texture path is actually drawn.
+    """
+
+    def __init__(self, kind, frames, color):
+        self.kind = kind
+        self.frames = frames
+        self.color = color
+        self.flipbook = None
+
+    def draw(self, x1, y1, x2, y2, x3, y3, x4, y4):
+        program = _programs[self.kind]
+        if procedural_enabled() and program.available():
+            draw_procedural_quad(program, x1, y1, x2, y2, x3, y3, x4, y4, self.color)
+            return
+        if self.flipbook is None:
+            self.flipbook = load_animated_texture(self.frames)
+        draw_animated_river(x1, y1, x2, y2, x3, y3, x4, y4, self.flipbook)
+
+    def release(self):
+        if self.flipbook is not None:
+            textures.release(self.flipbook)
+            self.flipbook = None
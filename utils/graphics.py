@@ -1,3 +1,4 @@
+import os
 import sys
 import math
 import random
@@ -8,27 +9,207 @@ from OpenGL.GLU import *
 import time
 from PIL import Image
 import time
+import numpy as np
+import ctypes
+from OpenGL.raw.GL.VERSION.GL_1_0 import glGetFloatv as raw_glGetFloatv
+
+from utils.texture_cache import load_image, load_variant
+
+# -------------------------------------------------
+# Frame-level render batcher
+# -------------------------------------------------
+# Every vertex is (x, y, u, v, r, g, b, a), already in eye space.
+BATCH_VERTEX_FLOATS = 8
+
+# add() reads the modelview matrix and draw_filled_circle() the current colour for
+# every primitive, so both use the raw entry point: the wrapped glGetFloatv costs
+# ~13us a call, the raw one ~1us (see asset_maker/culling.py)
+_float_buffer = (ctypes.c_float * 16)()
+_IDENTITY = [1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0, 0.0, 0.0, 0.0, 0.0, 1.0]
+
+
+def _current_color():
+    raw_glGetFloatv(GL_CURRENT_COLOR, _float_buffer)
+    return _float_buffer[0:4]
+
+
+def _bounds_overlap(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class RenderBatcher:
+    """
+    Collects the triangles of the simple primitives below (circles, grass, river quads)
+    and draws them grouped by texture. Vertices are transformed by the modelview matrix
+    when they are submitted, so matrix pushes between calls are honoured.
+
+    A primitive only joins an earlier group of the same texture when it does not overlap
+    any later group, so the picture is the same as drawing in order. Groups are tested
+    by the box around everything in them, newest first, so a submit costs one check
+    per group rather than one per primitive.
+    Anything that draws directly with GL must call flush_batches() first; the mesh,
+    shadow, layer and render-target code in this project already does.
+    """
+
+    def __init__(self):
+        self.groups = []     # [texture, [vertex arrays], bounds of everything in the group]
+        self.draw_calls = 0
+        self.texture_binds = 0
+        self.primitives = 0
+
+    def add(self, texture, verts):
+        """Queues an (n, 8) array of triangle vertices drawn with the given texture (0 = none)."""
+        raw_glGetFloatv(GL_MODELVIEW_MATRIX, _float_buffer)
+        matrix = _float_buffer[:]
+        if matrix != _IDENTITY:
+            xy = verts[:, 0:2] @ np.array((matrix[0:2], matrix[4:6]), dtype=np.float32) + matrix[12:14]
+            verts = np.concatenate((xy.astype(np.float32), verts[:, 2:]), axis=1)
+        low = verts[:, 0:2].min(axis=0).tolist()
+        high = verts[:, 0:2].max(axis=0).tolist()
+        bounds = (low[0], low[1], high[0], high[1])
+
+        # the newest group this one overlaps decides how early it may be drawn
+        groups = self.groups
+        lowest = 0
+        for index in range(len(groups) - 1, -1, -1):
+            if _bounds_overlap(bounds, groups[index][2]):
+                lowest = index if groups[index][0] == texture else index + 1
+                break
+        for index in range(lowest, len(groups)):
+            group = groups[index]
+            if group[0] == texture:
+                group[1].append(verts)
+                b = group[2]
+                group[2] = (min(b[0], bounds[0]), min(b[1], bounds[1]),
+                            max(b[2], bounds[2]), max(b[3], bounds[3]))
+                break
+        else:
+            groups.append([texture, [verts], bounds])
+        self.primitives += 1
+
+    def flush(self):
+        """Draws everything queued so far: one glDrawArrays per group."""
+        if not self.groups:
+            return
+        groups = self.groups
+        self.groups = []
+        current_color = glGetFloatv(GL_CURRENT_COLOR)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_COLOR_ARRAY)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        bound = 0
+        for texture, arrays, _ in groups:
+            data = np.concatenate(arrays)
+            if texture != bound:
+                if texture:
+                    glEnable(GL_TEXTURE_2D)
+                    glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+                else:
+                    glDisable(GL_TEXTURE_2D)
+                    glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+                glBindTexture(GL_TEXTURE_2D, texture)
+                bound = texture
+                self.texture_binds += 1
+            positions = np.ascontiguousarray(data[:, 0:2])
+            colors = np.ascontiguousarray(data[:, 4:8])
+            glVertexPointer(2, GL_FLOAT, 0, positions)
+            glColorPointer(4, GL_FLOAT, 0, colors)
+            if texture:
+                texcoords = np.ascontiguousarray(data[:, 2:4])
+                glTexCoordPointer(2, GL_FLOAT, 0, texcoords)
+            glDrawArrays(GL_TRIANGLES, 0, len(data))
+            self.draw_calls += 1
+        if bound:
+            glBindTexture(GL_TEXTURE_2D, 0)
+            glDisable(GL_TEXTURE_2D)
+            glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glPopMatrix()
+        glDisableClientState(GL_COLOR_ARRAY)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glColor4f(*current_color)
+
+    def stats(self):
+        """Primitives submitted, draw calls and texture binds since the last reset_stats()."""
+        return {"primitives": self.primitives, "draw_calls": self.draw_calls,
+                "texture_binds": self.texture_binds}
+
+    def reset_stats(self):
+        self.draw_calls = 0
+        self.texture_binds = 0
+        self.primitives = 0
+
+
+_batcher = RenderBatcher()
+
+
+def get_batcher():
+    return _batcher
+
+
+def flush_batches():
+    """Draws the primitives queued by the functions below. Call before any direct GL drawing."""
+    _batcher.flush()
+
+
+def _quad_vertices(corners, texcoords, colors):
+    """Two triangles (1, 2, 3) and (1, 3, 4) for a quad, the way GL_QUADS splits it."""
+    verts = np.empty((6, BATCH_VERTEX_FLOATS), dtype=np.float32)
+    for row, k in enumerate((0, 1, 2, 0, 2, 3)):
+        verts[row, 0:2] = corners[k]
+        verts[row, 2:4] = texcoords[k]
+        verts[row, 4:8] = colors[k]
+    return verts
+
+
+_QUAD_UV = ((0.0, 0.0), (1.0, 0.0), (1.0, 1.0), (0.0, 1.0))
+_circle_cache = {}
+
+
+def _unit_circle(segments):
+    """The triangle list of a unit circle fan with the given number of segments."""
+    tris = _circle_cache.get(segments)
+    if tris is None:
+        angles = 2 * np.pi * np.arange(segments + 1) / segments
+        rim = np.stack((np.cos(angles), np.sin(angles)), axis=1)
+        tris = np.zeros((segments * 3, 2), dtype=np.float64)
+        tris[1::3] = rim[:-1]
+        tris[2::3] = rim[1:]
+        _circle_cache[segments] = tris
+    return tris
+
 
 # -------------------------------------------------
-# Helper Function: Draw a Filled Circle using GL_TRIANGLE_FAN
+# Helper Function: Draw a Filled Circle (batched triangle fan)
 # -------------------------------------------------
 def draw_filled_circle(cx, cy, r, segments=30):
-    glBegin(GL_TRIANGLE_FAN)
-    glVertex2f(cx, cy)
-    for i in range(segments+1):
-        angle = 2 * math.pi * i / segments
-        x = cx + r * math.cos(angle)
-        y = cy + r * math.sin(angle)
-        glVertex2f(x, y)
-    glEnd()
+    """Filled circle in the current colour."""
+    color = _current_color()
+    xy = _unit_circle(segments) * r + (cx, cy)
+    verts = np.zeros((len(xy), BATCH_VERTEX_FLOATS), dtype=np.float32)
+    verts[:, 0:2] = xy
+    verts[:, 4:8] = color
+    _batcher.add(0, verts)
 
-def load_texture(filename):
-    # Open the image file
-    image = Image.open(filename)
-    image = image.convert("RGBA")  # Ensure we have an RGBA image
-    width, height = image.size
-    # Convert image data to bytes
-    img_data = image.tobytes("raw", "RGBA", 0, -1)
+def decode_image(filename):
+    """
+    Returns an image as an (height, width, 4) uint8 RGBA array, top row first.
+    Comes from the memory-mapped raw cache when fresh (see utils.texture_cache),
+    else PIL decodes the file. Touches no GL state, so it can run on a worker thread.
+    """
+    return load_image(filename)
+
+def _upload_texture(filename, pixels=None):
+    """
+    Uploads an image as an RGBA texture; returns (texture_id, width, height).
+    pixels may hold the already decoded image (see decode_image).
+    """
+    if pixels is None:
+        pixels = decode_image(filename)
+    height, width = pixels.shape[:2]
+    # OpenGL wants the bottom row first; for cached images this is the mapped file itself, not a copy
+    img_data = np.ascontiguousarray(pixels[::-1])
     
     # Generate a texture ID and bind it
     texture_id = glGenTextures(1)
@@ -41,73 +222,263 @@ def load_texture(filename):
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
     
     # Upload the texture data to the GPU
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
     glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
     
     # Unbind the texture and return the texture ID
     glBindTexture(GL_TEXTURE_2D, 0)
-    return texture_id
+    return texture_id, width, height
 
+def _upload_mipmaps(levels):
+    """Uploads a mip chain (top row first, largest first); returns (texture_id, bytes)."""
+    texture_id = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture_id)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+    glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+    size = 0
+    for level, pixels in enumerate(levels):
+        height, width = pixels.shape[:2]
+        glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE,
+                     np.ascontiguousarray(pixels[::-1]))
+        size += pixels.nbytes
+    glBindTexture(GL_TEXTURE_2D, 0)
+    return texture_id, size
 
-def draw_grass(x1, y1, x2, y2, x3, y3, x4, y4):
-    """Draws a more visually appealing animated grass quad with swaying and variations."""
+def load_texture(filename):
+    """Loads an image as a new GL texture. Prefer textures.acquire(), which shares and frees them."""
+    return _upload_texture(filename)[0]
 
-    time_factor = time.time() * 3  # Faster sway
 
-    # Variations for individual blades
-    blade_height = abs(y2 - y1)
-    sway_factor = 0.03  # Increased sway amplitude
-    sway_offset = x1 * 0.1  # Unique sway offset per blade
-    sway = math.sin(time_factor + sway_offset) * sway_factor * blade_height  # Proportional sway
+# -------------------------------------------------
+# Flipbook animations packed into one texture atlas
+# -------------------------------------------------
+class AnimatedTexture:
+    """
+    The frames of an animation packed side by side into one GL texture. A frame is
+    picked through its texture coordinates, so playing the animation never rebinds.
+    Each frame has a one-pixel border copied from its opposite edge, so linear
+    filtering at the edges matches a stand-alone GL_REPEAT texture.
+    """
 
-    # Gradient color for depth
-    base_green = 1
-    top_green = 1
-    color_diff = top_green - base_green
+    def __init__(self, filenames, frame_duration=0.1, columns=8, frames=None):
+        if not filenames:
+            raise ValueError("AnimatedTexture needs at least one frame")
+        if frames is None:
+            frames = [decode_image(f) for f in filenames]
+        height, width = frames[0].shape[:2]
+        for name, frame in zip(filenames, frames):
+            if frame.shape[:2] != (height, width):
+                raise ValueError(f"{name}: frame size {frame.shape[1]}x{frame.shape[0]} differs from {width}x{height}")
 
-    glBegin(GL_QUADS)
+        self.filenames = list(filenames)
+        self.frame_duration = frame_duration
+        self.frame_count = len(frames)
+        self.frame_size = (width, height)
+        columns = min(columns, self.frame_count)
+        rows = (self.frame_count + columns - 1) // columns
+        cell_w, cell_h = width + 2, height + 2
+        atlas_w, atlas_h = columns * cell_w, rows * cell_h
 
-    # Vertex 1 (bottom left)
-    glColor3f(0, base_green, 0) # Darker green at the base
-    glVertex2f(x1 + sway, y1)
+        atlas = np.zeros((atlas_h, atlas_w, 4), dtype=np.uint8)
+        self.size_bytes = atlas.nbytes
+        self.uvs = []
+        for i, frame in enumerate(frames):
+            col, row = i % columns, i // columns
+            x0, y0 = col * cell_w, row * cell_h
+            atlas[y0:y0 + cell_h, x0:x0 + cell_w] = np.pad(frame, ((1, 1), (1, 1), (0, 0)), mode="wrap")
+            # (u0, v0, u1, v1) of the frame; the atlas is uploaded bottom row first like load_texture
+            left, top = x0 + 1, y0 + 1
+            self.uvs.append((left / atlas_w, (atlas_h - top - height) / atlas_h,
+                             (left + width) / atlas_w, (atlas_h - top) / atlas_h))
 
-    # Vertex 2 (top left)
-    glColor3f(0, top_green, 0)  # Lighter green at the top
-    glVertex2f(x2 + sway, y2)
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, atlas_w, atlas_h, 0, GL_RGBA, GL_UNSIGNED_BYTE,
+                     np.ascontiguousarray(atlas[::-1]))
+        glBindTexture(GL_TEXTURE_2D, 0)
 
-    # Vertex 3 (top right)
-    glColor3f(0, top_green, 0) # Lighter green at the top
-    glVertex2f(x3 - sway, y3)
+    def __len__(self):
+        return self.frame_count
 
-    # Vertex 4 (bottom right)
-    glColor3f(0, base_green, 0) # Darker green at the base
-    glVertex2f(x4 - sway, y4)
+    def frame_index(self, now=None, frame_duration=None):
+        """The frame showing at time now (time.time() by default)."""
+        if now is None:
+            now = time.time()
+        return int(now / (frame_duration or self.frame_duration)) % self.frame_count
 
+    def texcoords(self, index):
+        """Corner texture coordinates of a frame, in the order draw_animated_river uses."""
+        u0, v0, u1, v1 = self.uvs[index]
+        return ((u0, v0), (u1, v0), (u1, v1), (u0, v1))
 
-    glEnd()
+    def release(self):
+        if self.texture:
+            glDeleteTextures([self.texture])
+            self.texture = 0
 
-def textured_grass(x1, y1, x2, y2, x3, y3, x4, y4, texture):
-    """Draws a textured quad with grass texture."""
-    glEnable(GL_TEXTURE_2D)
-    glBindTexture(GL_TEXTURE_2D, texture)
 
-    glBegin(GL_QUADS)
+# -------------------------------------------------
+# Texture manager: shared, refcounted GL textures
+# -------------------------------------------------
+def _texture_key(path):
+    """Normalises a texture path so "assets\\x.png" and "./assets/x.png" share one entry."""
+    return os.path.normcase(os.path.abspath(path.replace("\\", "/")))
 
-    glTexCoord2f(0.0, 0.0)
-    glVertex2f(x1, y1)
 
-    glTexCoord2f(1.0, 0.0)
-    glVertex2f(x2, y2)
+class TextureManager:
+    """
+    Owns every texture loaded through it. A path is loaded once however many games
+    use it; each acquire() must be paired with a release(), and the GL texture is
+    deleted when the last user releases it. Entries acquired with keep=True stay
+    resident at zero users (e.g. the water atlas, loaded once per process).
+    """
 
-    glTexCoord2f(1.0, 1.0)
-    glVertex2f(x3, y3)
+    def __init__(self):
+        self.entries = {}   # key -> {"resource", "texture", "bytes", "refs", "keep", "name"}
+        self.by_texture = {}  # GL texture id -> key
 
-    glTexCoord2f(0.0, 1.0)
-    glVertex2f(x4, y4)
+    def _acquire(self, key, name, load, keep):
+        entry = self.entries.get(key)
+        if entry is None:
+            resource, texture, size = load()
+            entry = self.entries[key] = {"resource": resource, "texture": texture, "bytes": size,
+                                         "refs": 0, "keep": keep, "name": name}
+            self.by_texture[texture] = key
+        entry["refs"] += 1
+        entry["keep"] = entry["keep"] or keep
+        return entry["resource"]
 
-    glEnd()
+    def acquire(self, path, keep=False, pixels=None, size=None):
+        """
+        Returns the GL texture id for an image file, loading it on first use.
+        With size=(width, height), the on-screen size it is drawn at, a downscaled and
+        mipmapped variant is used instead (cached on disk, see utils.texture_cache).
+        pixels may carry the image (or, with size, its mip chain) decoded off the GL thread.
+        """
+        if size is not None:
+            def load():
+                texture, nbytes = _upload_mipmaps(pixels if pixels is not None else load_variant(path, size))
+                return texture, texture, nbytes
+            return self._acquire(self.key(path, size), f"{path} @{size[0]}x{size[1]}", load, keep)
 
-    glBindTexture(GL_TEXTURE_2D, 0)
-    glDisable(GL_TEXTURE_2D)
+        def load():
+            texture, width, height = _upload_texture(path, pixels)
+            return texture, texture, width * height * 4
+        return self._acquire(self.key(path), path, load, keep)
+
+    def adopt(self, texture, name, size):
+        """
+        Takes over a GL texture made elsewhere (e.g. a baked shadow), so that it is
+        counted in report() and deleted by release()/clear() like the loaded ones.
+        """
+        return self._acquire(("adopted", texture), name, lambda: (texture, texture, size), False)
+
+    def acquire_animation(self, filenames, frame_duration=0.1, keep=False, frames=None):
+        """Returns the shared AnimatedTexture for a list of frame files."""
+        def load():
+            animation = AnimatedTexture(filenames, frame_duration, frames=frames)
+            return animation, animation.texture, animation.size_bytes
+        return self._acquire(self.key(filenames), f"{filenames[0]} (+{len(filenames) - 1} frames)", load, keep)
+
+    @staticmethod
+    def key(path_or_frames, size=None):
+        if not isinstance(path_or_frames, str):
+            return tuple(_texture_key(f) for f in path_or_frames)
+        if size is not None:
+            return (_texture_key(path_or_frames), tuple(size))
+        return _texture_key(path_or_frames)
+
+    def is_loaded(self, path_or_frames, size=None):
+        """True if the image (or the animation, given its frame list) is already resident."""
+        return self.key(path_or_frames, size) in self.entries
+
+    def release(self, texture):
+        """Drops one use of a texture id or AnimatedTexture; deletes it when unused."""
+        if isinstance(texture, AnimatedTexture):
+            texture = texture.texture
+        key = self.by_texture.get(texture)
+        if key is None:
+            return
+        entry = self.entries[key]
+        entry["refs"] = max(0, entry["refs"] - 1)
+        if entry["refs"] == 0 and not entry["keep"]:
+            self._delete(key)
+
+    def _delete(self, key):
+        entry = self.entries.pop(key)
+        del self.by_texture[entry["texture"]]
+        if isinstance(entry["resource"], AnimatedTexture):
+            entry["resource"].release()
+        else:
+            glDeleteTextures([entry["texture"]])
+
+    def clear(self):
+        """Deletes every texture, in use or not (e.g. before the GL context goes away)."""
+        for key in list(self.entries):
+            self._delete(key)
+
+    def live_bytes(self):
+        """Bytes of the textures this manager holds (see report() for what is left out)."""
+        return sum(entry["bytes"] for entry in self.entries.values())
+
+    def report(self):
+        """
+        One line per live texture plus the total, for logging. Only textures acquired
+        or adopted here are counted: static layer targets and mesh buffers are not.
+        """
+        lines = [f"{entry['bytes'] / 2**20:7.2f} MB  refs={entry['refs']}{' (kept)' if entry['keep'] else ''}  {entry['name']}"
+                 for entry in sorted(self.entries.values(), key=lambda e: -e["bytes"])]
+        lines.append(f"{self.live_bytes() / 2**20:7.2f} MB in {len(self.entries)} managed texture(s)")
+        return "\n".join(lines)
+
+
+textures = TextureManager()
+
+
+def load_animated_texture(filenames, frame_duration=0.1):
+    """
+    Returns the AnimatedTexture for these frames. It is loaded only once per process
+    and kept resident; callers should still textures.release() it when done.
+    """
+    return textures.acquire_animation(filenames, frame_duration, keep=True)
+
+def draw_grass(x1, y1, x2, y2, x3, y3, x4, y4):
+    """Draws a more visually appealing animated grass quad with swaying and variations."""
+
+    time_factor = time.time() * 3  # Faster sway
+
+    # Variations for individual blades
+    blade_height = abs(y2 - y1)
+    sway_factor = 0.03  # Increased sway amplitude
+    sway_offset = x1 * 0.1  # Unique sway offset per blade
+    sway = math.sin(time_factor + sway_offset) * sway_factor * blade_height  # Proportional sway
+
+    # Gradient color for depth
+    base_green = 1
+    top_green = 1
+    color_diff = top_green - base_green
+
+    base = (0.0, base_green, 0.0, 1.0)  # Darker green at the base
+    top = (0.0, top_green, 0.0, 1.0)    # Lighter green at the top
+    corners = ((x1 + sway, y1), (x2 + sway, y2), (x3 - sway, y3), (x4 - sway, y4))
+    _batcher.add(0, _quad_vertices(corners, _QUAD_UV, (base, top, top, base)))
+    # leave the current colour where the immediate-mode version left it
+    glColor3f(0, base_green, 0)
+
+def textured_grass(x1, y1, x2, y2, x3, y3, x4, y4, texture):
+    """Draws a textured quad with grass texture, tinted by the current colour."""
+    color = _current_color()
+    corners = ((x1, y1), (x2, y2), (x3, y3), (x4, y4))
+    _batcher.add(texture, _quad_vertices(corners, _QUAD_UV, (color,) * 4))
 
 
 
@@ -117,40 +488,24 @@ def draw_animated_river(x1, y1, x2, y2, x3, y3, x4, y4, textures, frame_duration
     
     Parameters:
         x1, y1, ..., x4, y4: Coordinates of the quad's vertices.
-        textures: A list of OpenGL texture IDs representing the animation frames.
+        textures: An AnimatedTexture, or a list of OpenGL texture IDs (one per frame).
         frame_duration: Duration (in seconds) that each frame is displayed.
     """
     # Determine the current frame based on time
     num_frames = len(textures)
     current_frame = int(time.time() / frame_duration) % num_frames
-    current_texture = textures[current_frame]
-    
-    # Enable texturing and bind the current texture
-    glEnable(GL_TEXTURE_2D)
-    glBindTexture(GL_TEXTURE_2D, current_texture)
+    if isinstance(textures, AnimatedTexture):
+        current_texture = textures.texture
+        texcoords = textures.texcoords(current_frame)
+    else:
+        current_texture = textures[current_frame]
+        texcoords = _QUAD_UV
+
     # water blue
     glColor3f(0, 0.7, 1)
-    
-    glBegin(GL_QUADS)
-    
-    # Define texture coordinates and corresponding vertices
-    glTexCoord2f(0.0, 0.0)
-    glVertex2f(x1, y1)
-    
-    glTexCoord2f(1.0, 0.0)
-    glVertex2f(x2, y2)
-    
-    glTexCoord2f(1.0, 1.0)
-    glVertex2f(x3, y3)
-    
-    glTexCoord2f(0.0, 1.0)
-    glVertex2f(x4, y4)
-    
-    glEnd()
-    
-    # Unbind texture and disable texturing
-    glBindTexture(GL_TEXTURE_2D, 0)
-    glDisable(GL_TEXTURE_2D)
+    water = (0.0, 0.7, 1.0, 1.0)
+    corners = ((x1, y1), (x2, y2), (x3, y3), (x4, y4))
+    _batcher.add(current_texture, _quad_vertices(corners, texcoords, (water,) * 4))
 
 def draw_animated_space(x1, y1, x2, y2, x3, y3, x4, y4, textures, frame_duration=0.1):
     """
@@ -158,13 +513,19 @@ def draw_animated_space(x1, y1, x2, y2, x3, y3, x4, y4, textures, frame_duration
     
     Parameters:
         x1, y1, ..., x4, y4: Coordinates of the quad's vertices.
-        textures: A list of OpenGL texture IDs representing the animation frames.
+        textures: An AnimatedTexture, or a list of OpenGL texture IDs (one per frame).
         frame_duration: Duration (in seconds) that each frame is displayed.
     """
     # Determine the current frame based on time
     num_frames = len(textures)
     current_frame = int(time.time() / frame_duration) % num_frames
-    current_texture = textures[current_frame]
+    if isinstance(textures, AnimatedTexture):
+        current_texture = textures.texture
+        texcoords = textures.texcoords(current_frame)
+    else:
+        current_texture = textures[current_frame]
+        texcoords = _QUAD_UV
+    flush_batches()
     
     # Enable texturing and bind the current texture
     glEnable(GL_TEXTURE_2D)
@@ -176,16 +537,16 @@ def draw_animated_space(x1, y1, x2, y2, x3, y3, x4, y4, textures, frame_duration
     glBegin(GL_QUADS)
     
     # Define texture coordinates and corresponding vertices
-    glTexCoord2f(0.0, 0.0)
+    glTexCoord2f(*texcoords[0])
     glVertex2f(x1, y1)
     
-    glTexCoord2f(1.0, 0.0)
+    glTexCoord2f(*texcoords[1])
     glVertex2f(x2, y2)
     
-    glTexCoord2f(1.0, 1.0)
+    glTexCoord2f(*texcoords[2])
     glVertex2f(x3, y3)
     
-    glTexCoord2f(0.0, 1.0)
+    glTexCoord2f(*texcoords[3])
     glVertex2f(x4, y4)
     
     glEnd()
@@ -197,11 +558,141 @@ def draw_animated_space(x1, y1, x2, y2, x3, y3, x4, y4, textures, frame_duration
 
 
 def draw_river(x1, y1, x2, y2, x3, y3, x4, y4):
-    glBegin(GL_QUADS)
     glColor3f(0.0, 0.4, 1.0)
-    glVertex2f(x1, y1)
-    glVertex2f(x2, y2)
-    glVertex2f(x3, y3)
-    glVertex2f(x4, y4)
-    glEnd()
+    blue = (0.0, 0.4, 1.0, 1.0)
+    corners = ((x1, y1), (x2, y2), (x3, y3), (x4, y4))
+    _batcher.add(0, _quad_vertices(corners, _QUAD_UV, (blue,) * 4))
+
+
+# -------------------------------------------------
+# Offscreen render targets
+# -------------------------------------------------
+class RenderTarget:
+    """
+    An offscreen framebuffer with an RGBA colour texture attached.
+    Drawing between begin() and end() uses the same top-left origin pixel
+    coordinates as the main window.
+    """
+
+    def __init__(self, width, height):
+        self.width = max(1, int(width))
+        self.height = max(1, int(height))
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA8, self.width, self.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
+        previous = glGetIntegerv(GL_FRAMEBUFFER_BINDING)
+        self.fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, self.texture, 0)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, previous)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self.release()
+            raise RuntimeError(f"Framebuffer incomplete (status 0x{status:x})")
+
+        self._saved = None
+
+    def begin(self, clear_color=(0.0, 0.0, 0.0, 0.0)):
+        """Redirects drawing into the target and clears it."""
+        flush_batches()
+        self._saved = (glGetIntegerv(GL_FRAMEBUFFER_BINDING), glGetIntegerv(GL_VIEWPORT),
+                       glGetFloatv(GL_COLOR_CLEAR_VALUE))
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, self.width, self.height)
+        glMatrixMode(GL_PROJECTION)
+        glPushMatrix()
+        glLoadIdentity()
+        gluOrtho2D(0, self.width, self.height, 0)
+        glMatrixMode(GL_MODELVIEW)
+        glPushMatrix()
+        glLoadIdentity()
+        glClearColor(*clear_color)
+        glClear(GL_COLOR_BUFFER_BIT)
+
+    def end(self):
+        """Restores the framebuffer, viewport, clear colour and matrices saved by begin()."""
+        flush_batches()
+        previous, viewport, clear_color = self._saved
+        self._saved = None
+        glMatrixMode(GL_PROJECTION)
+        glPopMatrix()
+        glMatrixMode(GL_MODELVIEW)
+        glPopMatrix()
+        glBindFramebuffer(GL_FRAMEBUFFER, previous)
+        glViewport(*viewport)
+        glClearColor(*clear_color)
+
+    def read_alpha(self):
+        """Reads the alpha channel back as a (height, width) uint8 array, bottom row first."""
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        data = glReadPixels(0, 0, self.width, self.height, GL_ALPHA, GL_UNSIGNED_BYTE)
+        return np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width).copy()
+
+    def release(self):
+        if self.fbo:
+            glDeleteFramebuffers(1, [self.fbo])
+            self.fbo = 0
+        if self.texture:
+            glDeleteTextures([self.texture])
+            self.texture = 0
+
+
+# -------------------------------------------------
+# Static layers: scenery rasterized once, blitted every frame
+# -------------------------------------------------
+class StaticLayer:
+    """
+    Caches scenery that never changes (sky, banks, menu background) in an offscreen
+    texture. draw_fn is only called when the layer is first shown and when the viewport
+    size changes; every other frame is a single textured quad.
+    """
+
+    def __init__(self, draw_fn, width, height):
+        self.draw_fn = draw_fn
+        self.width = width
+        self.height = height
+        self.target = None
+
+    def rebuild(self, pixel_width, pixel_height):
+        self.release()
+        self.target = RenderTarget(pixel_width, pixel_height)
+        self.target.begin()
+        # Same coordinate system as the window, whatever the pixel resolution.
+        glScalef(pixel_width / self.width, pixel_height / self.height, 1.0)
+        self.draw_fn()
+        self.target.end()
+
+    def draw(self):
+        flush_batches()
+        viewport = glGetIntegerv(GL_VIEWPORT)
+        pixel_width, pixel_height = int(viewport[2]), int(viewport[3])
+        if self.target is None or (self.target.width, self.target.height) != (pixel_width, pixel_height):
+            self.rebuild(pixel_width, pixel_height)
+
+        glEnable(GL_TEXTURE_2D)
+        glBindTexture(GL_TEXTURE_2D, self.target.texture)
+        glColor4f(1.0, 1.0, 1.0, 1.0)
+        glBegin(GL_QUADS)
+        glTexCoord2f(0.0, 1.0)
+        glVertex2f(0, 0)
+        glTexCoord2f(1.0, 1.0)
+        glVertex2f(self.width, 0)
+        glTexCoord2f(1.0, 0.0)
+        glVertex2f(self.width, self.height)
+        glTexCoord2f(0.0, 0.0)
+        glVertex2f(0, self.height)
+        glEnd()
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glDisable(GL_TEXTURE_2D)
 
+    def release(self):
+        if self.target is not None:
+            self.target.release()
+            self.target = None
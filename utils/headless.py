@@ -0,0 +1,144 @@
+import os
+import sys
+import time
+import random
+import argparse
+import importlib
+from contextlib import redirect_stdout
+
+if __package__ in (None, ""):
+    # Running the benchmark directly as utils/headless.py: import from the project root,
+    # not from utils/ (where assets.py would hide the assets package).
+    sys.path[0] = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+from pygame.locals import K_DOWN, K_LEFT, K_RIGHT, K_UP
+
+from utils.timestep import SIM_STEP
+
+# -------------------------------------------------
+# Headless simulation (no GL calls in here)
+# -------------------------------------------------
+# Builds a biome game with headless=True (shapes are loaded, no textures, no window,
+# no imgui) and calls its update() directly with fixed steps and scripted input, as
+# fast as the CPU allows. Used to benchmark the simulation on its own:
+#
+#     python utils/headless.py [river space squid] [--seconds 5] [--seed 1]
+BIOMES = {
+    "river": ("river_biome.game", "RiverCrossingGame"),
+    "space": ("space_biome.game", "SpaceCrossingGame"),
+    "squid": ("squid_biome.game", "SquidCrossingGame"),
+}
+
+# how often the scripted player picks new keys, in simulated seconds
+INPUT_INTERVAL = 0.25
+DIRECTIONS = [(), (K_RIGHT,), (K_RIGHT, K_UP), (K_RIGHT, K_DOWN), (K_UP,), (K_DOWN,), (K_LEFT,)]
+
+
+class ScriptedKeys:
+    """Stands in for pygame.key.get_pressed(): keys[K_LEFT] is True while K_LEFT is held."""
+
+    def __init__(self):
+        self.held = set()
+
+    def __getitem__(self, key):
+        return key in self.held
+
+
+def make_game(biome):
+    """A biome game with its full state (levels, entities, shapes) but no GL resources."""
+    module, name = BIOMES[biome]
+    game = getattr(importlib.import_module(module), name)(headless=True)
+    game.story_shown = True
+    return game
+
+
+class HeadlessRun:
+    """
+    Steps one headless game with a seeded random player that mostly heads right,
+    jumps (river) and hovers (space) now and then. Game over starts a new game and
+    a win loads the next level, or a new game after the last one.
+    """
+
+    def __init__(self, biome, seed=1, step=SIM_STEP):
+        self.biome = biome
+        self.step = step
+        random.seed(seed)  # the levels place some entities at random
+        self.rng = random.Random(seed)
+        self.game = make_game(biome)
+        self.keys = ScriptedKeys()
+        self.ticks = 0
+        self.games = 1
+        self.levels = 1
+        self.next_input = 0.0
+
+    def script(self):
+        game = self.game
+        self.keys.held = set(self.rng.choice(DIRECTIONS))
+        if self.biome == "river" and self.rng.random() < 0.5:
+            game.player.start_jump()
+        elif self.biome == "space" and self.rng.random() < 0.2:
+            game.player.toggle_hover()
+
+    def tick(self):
+        game = self.game
+        if self.ticks * self.step >= self.next_input:
+            self.script()
+            self.next_input += INPUT_INTERVAL
+        game.update(self.step, self.keys)
+        self.ticks += 1
+        if game.is_game_over():
+            game.new_game()
+            game.story_shown = True
+            self.games += 1
+        elif game.is_win():
+            if not game.next_level():
+                game.new_game()
+                self.games += 1
+            game.story_shown = True
+            game.paused = False
+            self.levels += 1
+
+    def run(self, ticks):
+        for _ in range(ticks):
+            self.tick()
+
+
+def benchmark(biomes=tuple(BIOMES), seconds=5.0, seed=1, quiet=True):
+    """
+    Steps each biome for about `seconds` of wall time and prints the simulated ticks
+    per second (and how many times faster than real time that is). The games' own
+    prints are silenced unless quiet is False. Returns {biome: ticks per second}.
+    """
+    results = {}
+    print(f"{'biome':8s} {'ticks':>9s} {'ticks/s':>10s} {'x realtime':>11s} {'games':>6s} {'levels':>7s}")
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull if quiet else sys.stdout):
+        for biome in biomes:
+            run = HeadlessRun(biome, seed)
+            run.run(100)  # warm up: first-use allocations and caches
+            start = time.perf_counter()
+            end = start + seconds
+            ticks = 0
+            while True:
+                run.run(500)
+                ticks += 500
+                now = time.perf_counter()
+                if now >= end:
+                    break
+            rate = ticks / (now - start)
+            results[biome] = rate
+            print(f"{biome:8s} {ticks:9d} {rate:10.0f} {rate * run.step:10.1f}x {run.games:6d} {run.levels:7d}",
+                  file=sys.__stdout__)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the biome simulations without a window.")
+    parser.add_argument("biomes", nargs="*", default=list(BIOMES), help=", ".join(BIOMES))
+    parser.add_argument("--seconds", type=float, default=5.0, help="wall time per biome")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--verbose", action="store_true", help="keep the games' own prints")
+    args = parser.parse_args()
+    for biome in args.biomes:
+        if biome not in BIOMES:
+            parser.error(f"unknown biome '{biome}'")
+    benchmark(args.biomes, args.seconds, args.seed, quiet=not args.verbose)
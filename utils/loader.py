@@ -0,0 +1,220 @@
+import io
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.assets import shape_assets
+from utils.effects import procedural_enabled
+from utils.graphics import decode_image, textures
+from utils.texture_cache import TEXTURE_CACHE_DIR, load_variant
+
+# -------------------------------------------------
+# Asynchronous texture loading
+# -------------------------------------------------
+# PNG decoding happens on worker threads; only the glTexImage2D uploads run on the
+# GL thread, a few per frame, so the window keeps drawing while a biome loads.
+DECODE_WORKERS = 4
+UPLOADS_PER_FRAME = 2
+
+
+def _read_file(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+class AssetLoader:
+    """
+    Loads a set of textures and flipbook animations into the texture manager in the
+    background. Call pump() once per frame until done, then construct whatever uses
+    the textures (its own acquire() calls find them resident) and call release().
+    Shapes are loaded into the shape registry on the same workers, and music files
+    are read into memory (see music_source()).
+    """
+
+    def __init__(self, texture_paths=(), animations=(), frame_duration=0.1,
+                 workers=DECODE_WORKERS, uploads_per_frame=UPLOADS_PER_FRAME,
+                 shapes=(), music=()):
+        self.frame_duration = frame_duration
+        self.uploads_per_frame = uploads_per_frame
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="decode")
+        self.pending = []   # (kind, name, futures, size) in request order
+        self.held = []      # resources acquired by the loader, released in release()
+        self.music = {}     # path -> file contents
+        self.total = 0
+        self.uploaded = 0
+        self.files = 0          # images to decode
+        self.files_uploaded = 0
+
+        for path in texture_paths:
+            # a (path, (width, height)) entry asks for the sized, mipmapped variant
+            path, size = path if isinstance(path, tuple) else (path, None)
+            self._request("texture", path, [path], size)
+        for frames in animations:
+            self._request("animation", list(frames), list(frames))
+        for path in shapes:
+            self._request("shape", path, [path])
+        for path in music:
+            self._request("music", path, [path])
+
+    def _request(self, kind, name, files, size=None):
+        self.total += 1
+        if kind == "shape" and name in shape_assets:
+            self.uploaded += 1
+            return
+        if kind in ("texture", "animation") and textures.is_loaded(name, size):
+            self._take(kind, name, None, size)
+            self.uploaded += 1
+            return
+        self.files += len(files)
+        if kind == "shape":
+            futures = [self.pool.submit(shape_assets.preload, name)]
+        elif kind == "music":
+            futures = [self.pool.submit(_read_file, name)]
+        elif size is not None:
+            futures = [self.pool.submit(load_variant, f, size) for f in files]
+        else:
+            futures = [self.pool.submit(decode_image, f) for f in files]
+        self.pending.append((kind, name, futures, size))
+
+    def _take(self, kind, name, decoded, size=None):
+        if kind == "shape":
+            return  # the registry keeps it
+        if kind == "music":
+            self.music[name] = decoded[0]
+        elif kind == "texture":
+            pixels = decoded[0] if decoded else None
+            self.held.append(textures.acquire(name, pixels=pixels, size=size))
+        else:
+            self.held.append(textures.acquire_animation(name, self.frame_duration, keep=True, frames=decoded))
+
+    def pump(self):
+        """Uploads up to uploads_per_frame finished images. Must run on the GL thread."""
+        budget = self.uploads_per_frame
+        for item in list(self.pending):
+            if budget == 0:
+                break
+            kind, name, futures, size = item
+            if not all(f.done() for f in futures):
+                continue
+            # result() re-raises a decoding error here, on the main thread
+            self._take(kind, name, [f.result() for f in futures], size)
+            self.pending.remove(item)
+            self.uploaded += 1
+            self.files_uploaded += len(futures)
+            if kind in ("texture", "animation"):
+                budget -= 1
+        if not self.pending:
+            self.pool.shutdown(wait=False)
+        return self.done
+
+    @property
+    def done(self):
+        return not self.pending
+
+    def progress(self):
+        """Fraction of the work finished, counting decoded images and uploads."""
+        decoded = self.files_uploaded + sum(f.done() for _, _, futures, _ in self.pending for f in futures)
+        steps = self.files + self.total
+        return 1.0 if steps == 0 else (decoded + self.uploaded) / steps
+
+    def music_source(self, path):
+        """An in-memory file for mixer.music.load if the loader has read path, else path."""
+        data = self.music.get(path)
+        return io.BytesIO(data) if data is not None else path
+
+    def release(self):
+        """Drops the loader's own references; the textures stay while someone else holds them."""
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        for resource in self.held:
+            textures.release(resource)
+        self.held = []
+        self.music = {}
+
+
+def manifest_loader(manifest, with_music=False, **kwargs):
+    """An AssetLoader for a biome's MANIFEST; the music is only read if asked for."""
+    return AssetLoader(manifest.get("textures", ()),
+                       [] if procedural_enabled() else manifest.get("flipbooks", ()),
+                       shapes=manifest.get("shapes", ()),
+                       music=[manifest["music"]] if with_music and manifest.get("music") else (),
+                       **kwargs)
+
+
+# -------------------------------------------------
+# Prefetching from the menu
+# -------------------------------------------------
+# While the menu is up, the biomes' manifests are loaded one after another, most
+# recently played first, so that starting a biome finds everything resident. The
+# uploads are kept to one per frame so the menu stays smooth.
+RECENT_FILE = os.path.join(os.path.dirname(TEXTURE_CACHE_DIR), "recent_biomes.json")
+PREFETCH_WORKERS = 2
+
+
+def _read_recent():
+    try:
+        with open(RECENT_FILE, "r") as f:
+            return [name for name in json.load(f) if isinstance(name, str)]
+    except (OSError, ValueError, TypeError):
+        return []
+
+
+def recent_order(names):
+    """names, most recently played first (as remembered by remember_played())."""
+    recent = [name for name in _read_recent() if name in names]
+    return recent + [name for name in names if name not in recent]
+
+
+def remember_played(name):
+    """Moves name to the front of the recently played list on disk."""
+    order = [name] + [n for n in _read_recent() if n != name]
+    try:
+        os.makedirs(os.path.dirname(RECENT_FILE) or ".", exist_ok=True)
+        with open(RECENT_FILE, "w") as f:
+            json.dump(order, f)
+    except OSError as e:
+        print(f"Could not remember the last biome played: {e}")
+
+
+class Prefetcher:
+    """
+    Warms the assets of several manifests in the background, in the given order.
+    Call pump() once per frame on the GL thread, and release() when the game that
+    needed them has acquired its own references.
+    """
+
+    def __init__(self, manifests, order, workers=PREFETCH_WORKERS):
+        self.manifests = manifests
+        self.queue = [name for name in order if name in manifests]
+        self.workers = workers
+        self.loaders = {}   # name -> AssetLoader, in the order they were started
+        self.current = None
+
+    def pump(self):
+        if self.current is not None:
+            try:
+                if not self.loaders[self.current].pump():
+                    return False
+            except Exception as e:
+                # leave it to the real load to report the error when the biome starts
+                print(f"Prefetching {self.current} failed: {e}")
+                self.loaders.pop(self.current).release()
+        if not self.queue:
+            self.current = None
+            return True
+        self.current = self.queue.pop(0)
+        self.loaders[self.current] = manifest_loader(self.manifests[self.current], with_music=True,
+                                                     workers=self.workers, uploads_per_frame=1)
+        return False
+
+    def music_source(self, path):
+        for loader in self.loaders.values():
+            if path in loader.music:
+                return loader.music_source(path)
+        return path
+
+    def release(self):
+        for loader in self.loaders.values():
+            loader.release()
+        self.loaders = {}
+        self.queue = []
+        self.current = None
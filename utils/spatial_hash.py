@@ -0,0 +1,76 @@
+import numpy as np
+
+# -------------------------------------------------
+# Uniform-grid spatial hash (no GL calls in here)
+# -------------------------------------------------
+# Circles are binned by the grid cell their centre is
+# in. A rebuild sorts them by cell once; candidate_pairs() then pairs every circle
+# with those in its own and the neighbouring cells. Cells should be at least as
+# wide as the largest circle, so that overlapping circles are always in
+# neighbouring cells.
+
+# cell (cx, cy) -> one integer key; cy is offset so negative cells stay distinct
+_KEY_STRIDE = 1 << 32
+_KEY_OFFSET = 1 << 31
+
+# key offsets of the neighbour cells a cell is paired with, so that each pair of
+# neighbouring cells is visited once: (0, 1), (1, -1), (1, 0) and (1, 1)
+_NEIGHBOUR_KEYS = np.array([dx * _KEY_STRIDE + dy for dx, dy in ((0, 1), (1, -1), (1, 0), (1, 1))],
+                           dtype=np.int64)
+
+
+def _cell_key(cx, cy):
+    return cx * _KEY_STRIDE + (cy + _KEY_OFFSET)
+
+
+class SpatialHash:
+    """
+    Spatial hash over n circles, rebuilt from their centre arrays.
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = float(cell_size)
+        self.rebuild(np.zeros(0), np.zeros(0))
+
+    def rebuild(self, x, y):
+        """Re-bins every circle; call after the centres have moved."""
+        n = len(x)
+        self.count = n
+        keys = _cell_key(np.floor(x / self.cell_size).astype(np.int64),
+                         np.floor(y / self.cell_size).astype(np.int64))
+        self.order = np.argsort(keys, kind="stable")
+        self.sorted_keys = keys[self.order]
+        # runs of equal keys in sorted order are the occupied cells
+        new_cell = np.empty(n, dtype=bool)
+        new_cell[:1] = True
+        np.not_equal(self.sorted_keys[1:], self.sorted_keys[:-1], out=new_cell[1:])
+        self.cell_starts = np.flatnonzero(new_cell)
+        self.cell_keys = self.sorted_keys[self.cell_starts]
+        self.cell_ends = np.append(self.cell_starts[1:], n)
+        self.cell_of = np.cumsum(new_cell) - 1    # cell index of each sorted item
+
+    def candidate_pairs(self):
+        """
+        Index arrays (i, j) of every pair of items in the same or neighbouring cells,
+        each pair once: all pairs that can overlap when cells are as wide as the circles.
+        """
+        n = self.count
+        if n < 2:
+            empty = np.zeros(0, dtype=np.intp)
+            return empty, empty
+        rank = np.arange(n)
+        # the items after each one in its own cell ...
+        own_starts = rank + 1
+        own_counts = self.cell_ends[self.cell_of] - own_starts
+        # ... and every item of the neighbouring cells, all offsets in one go
+        targets = (self.sorted_keys[None, :] + _NEIGHBOUR_KEYS[:, None]).ravel()
+        found = np.minimum(np.searchsorted(self.cell_keys, targets), len(self.cell_keys) - 1)
+        present = self.cell_keys[found] == targets
+        starts = np.concatenate((own_starts, self.cell_starts[found]))
+        counts = np.concatenate((own_counts, np.where(present, self.cell_ends[found] - self.cell_starts[found], 0)))
+        owners = np.tile(rank, len(_NEIGHBOUR_KEYS) + 1)
+        total = int(counts.sum())
+        # position of each pair within its item's run: 0, 1, ... counts-1
+        offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+        order = self.order
+        return order[np.repeat(owners, counts)], order[np.repeat(starts, counts) + offsets]
@@ -0,0 +1,158 @@
+import os
+import mmap
+import struct
+import hashlib
+import numpy as np
+from PIL import Image
+
+# -------------------------------------------------
+# Raw texture cache (no GL calls in here)
+# -------------------------------------------------
+# Decoded images are kept under TEXTURE_CACHE_DIR as .rgba files: a small header,
+# a table of mip level sizes, then the RGBA pixels of every level stored bottom row
+# first, exactly as glTexImage2D wants them. Files are opened with mmap and handed
+# to GL as numpy views of the mapping, so a cached load copies nothing in Python.
+#
+# A cache file is fresh while the source's size and mtime match its header; if
+# they do not (checkout, touch) the source's SHA-1 decides, and a changed source
+# falls back to decoding the PNG and rewriting the cache.
+TEXTURE_CACHE_DIR = os.environ.get("RIVER_GAME_TEXTURE_CACHE", os.path.join(".cache", "textures"))
+
+RAW_MAGIC = b"RGBA"
+RAW_VERSION = 1
+# magic, version, level count, source size, source mtime (ns), source SHA-1
+RAW_HEADER = struct.Struct("<4sIIQq20s")
+RAW_LEVEL = struct.Struct("<II")
+RAW_ALIGN = 64
+
+
+def _next_power_of_two(n):
+    size = 1
+    while size < n:
+        size *= 2
+    return size
+
+
+def variant_size(source_size, target_size):
+    """
+    Size of the variant of a source image meant to cover target_size pixels on screen:
+    the next power of two of each target side, never larger than the source.
+    """
+    return (min(source_size[0], _next_power_of_two(max(1, int(target_size[0])))),
+            min(source_size[1], _next_power_of_two(max(1, int(target_size[1])))))
+
+
+def build_mipmaps(image):
+    """Mip chain of an RGBA PIL image as (height, width, 4) uint8 arrays, largest first."""
+    levels = [np.asarray(image)]
+    while image.width > 1 or image.height > 1:
+        image = image.resize((max(1, image.width // 2), max(1, image.height // 2)), Image.BOX)
+        levels.append(np.asarray(image))
+    return levels
+
+
+def source_hash(filename):
+    """SHA-1 of a file's contents."""
+    digest = hashlib.sha1()
+    with open(filename, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.digest()
+
+
+def raw_cache_path(filename, tag):
+    """Cache file of a source image; tag is "full" or the variant size, e.g. "128x1024"."""
+    name = hashlib.sha1(os.path.abspath(filename).replace("\\", "/").encode("utf-8")).hexdigest()[:20]
+    return os.path.join(TEXTURE_CACHE_DIR, f"{name}_{tag}.rgba")
+
+
+def read_raw(path, filename):
+    """
+    Maps a cache file and returns its levels as read-only (height, width, 4) views,
+    top row first (flipped views, so flipping back gives the contiguous GL order).
+    Returns None if the file is missing, corrupt or stale.
+    """
+    try:
+        stat = os.stat(filename)
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, version, count, size, mtime, digest = RAW_HEADER.unpack_from(data, 0)
+        if magic != RAW_MAGIC or version != RAW_VERSION or count == 0:
+            return None
+        if (size, mtime) != (stat.st_size, stat.st_mtime_ns) and digest != source_hash(filename):
+            return None
+        offset = RAW_HEADER.size
+        dims = []
+        for _ in range(count):
+            dims.append(RAW_LEVEL.unpack_from(data, offset))
+            offset += RAW_LEVEL.size
+        offset = -(-offset // RAW_ALIGN) * RAW_ALIGN
+        levels = []
+        for width, height in dims:
+            n = width * height * 4
+            if offset + n > len(data):
+                return None
+            pixels = np.frombuffer(data, dtype=np.uint8, count=n, offset=offset)
+            levels.append(pixels.reshape(height, width, 4)[::-1])
+            offset += n
+        return levels
+    except struct.error:
+        return None
+
+
+def write_raw(path, filename, levels):
+    """Writes levels (top row first) to a cache file, atomically."""
+    try:
+        stat = os.stat(filename)
+        header = RAW_HEADER.pack(RAW_MAGIC, RAW_VERSION, len(levels), stat.st_size,
+                                 stat.st_mtime_ns, source_hash(filename))
+        table = b"".join(RAW_LEVEL.pack(level.shape[1], level.shape[0]) for level in levels)
+        padding = -(len(header) + len(table)) % RAW_ALIGN
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(header + table + b"\0" * padding)
+            for level in levels:
+                f.write(np.ascontiguousarray(level[::-1]).data)
+        os.replace(tmp, path)
+    except OSError as e:
+        print(f"Could not cache texture {path}: {e}")
+
+
+def load_image(filename):
+    """
+    The image as a (height, width, 4) RGBA array, top row first: mapped from the raw
+    cache if it is fresh, otherwise decoded from the source and cached.
+    Safe to call from worker threads.
+    """
+    path = raw_cache_path(filename, "full")
+    levels = read_raw(path, filename)
+    if levels is not None:
+        return levels[0]
+    with Image.open(filename) as image:
+        pixels = np.asarray(image.convert("RGBA"))
+    write_raw(path, filename, [pixels])
+    return pixels
+
+
+def load_variant(filename, target_size):
+    """
+    Returns the mip chain (top row first, largest level first) of filename scaled
+    for target_size, from the raw cache if possible, otherwise built and cached.
+    Safe to call from worker threads.
+    """
+    with Image.open(filename) as image:
+        size = variant_size(image.size, target_size)
+        path = raw_cache_path(filename, f"{size[0]}x{size[1]}")
+        levels = read_raw(path, filename)
+        if levels is not None:
+            return levels
+        image = image.convert("RGBA")
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+    levels = build_mipmaps(image)
+    write_raw(path, filename, levels)
+    return levels
@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+
+# -------------------------------------------------
+# Fixed-step simulation (no GL calls in here)
+# -------------------------------------------------
+# The games used to advance by whatever clock.tick() measured, so a hitch fed a
+# giant dt into the physics and anything tuned per frame (friction) changed with
+# the frame rate. Now rendered time goes into an accumulator that is spent in
+# steps of SIM_STEP; the remainder, as a fraction of a step, is how far the frame
+# lies between the last two simulated states, and positions are drawn blended
+# between them.
+SIM_STEP = 1.0 / 120.0
+# At most this many steps per rendered frame; time beyond that is dropped, so a
+# long stall slows the game down for a moment instead of piling up more work.
+MAX_STEPS = 8
+# Entities that moved further than this in one step were placed (respawn, new
+# level) rather than moved, and are drawn where they are.
+TELEPORT_DISTANCE = 40.0
+
+
+class FixedTimestep:
+    """
+    Turns rendered frame times into a number of fixed simulation steps:
+        for _ in range(timestep.advance(frame_dt)):
+            update(timestep.step)
+    alpha is then the fraction of a step the frame is ahead of the last update.
+    """
+
+    def __init__(self, step=SIM_STEP, max_steps=MAX_STEPS):
+        self.step = step
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.steps = 0        # steps run in total
+        self.dropped = 0.0    # seconds thrown away by the catch-up cap
+
+    def advance(self, frame_dt):
+        """Adds one rendered frame's time; returns how many steps to run for it."""
+        self.accumulator += max(0.0, frame_dt)
+        steps = int(self.accumulator / self.step)
+        if steps > self.max_steps:
+            self.dropped += (steps - self.max_steps) * self.step
+            self.accumulator -= (steps - self.max_steps) * self.step
+            steps = self.max_steps
+        self.accumulator -= steps * self.step
+        self.alpha = min(1.0, self.accumulator / self.step)
+        self.steps += steps
+        return steps
+
+    def reset(self):
+        """Forgets banked time, e.g. while paused, so resuming does not fast-forward."""
+        self.accumulator = 0.0
+        self.alpha = 1.0
+
+
+class Interpolator:
+    """
+    Remembers where entities were before the latest simulation step so that they
+    can be drawn between that and where they are now.
+    """
+
+    def __init__(self, teleport_distance=TELEPORT_DISTANCE):
+        self.teleport_distance = teleport_distance
+        self.previous = {}   # id(entity) -> (entity, x, y)
+
+    def snapshot(self, entities):
+        """Call before each step with every entity that moves."""
+        self.previous = {id(e): (e, e.x, e.y) for e in entities}
+
+    def clear(self):
+        self.previous = {}
+
+    @contextmanager
+    def blended(self, alpha):
+        """
+        Within the block every snapshotted entity has its x and y set part way
+        (alpha) from its previous to its current position; they are put back after.
+        Entities created since the last snapshot are drawn where they are.
+        """
+        moved = []
+        limit = self.teleport_distance
+        for entity, x0, y0 in self.previous.values():
+            x1, y1 = entity.x, entity.y
+            if (x0 == x1 and y0 == y1) or abs(x1 - x0) > limit or abs(y1 - y0) > limit:
+                continue
+            moved.append((entity, x1, y1))
+            entity.x = x0 + (x1 - x0) * alpha
+            entity.y = y0 + (y1 - y0) * alpha
+        try:
+            yield
+        finally:
+            for entity, x1, y1 in moved:
+                entity.x = x1
+                entity.y = y1